@@ -75,6 +75,29 @@ def GetChromePrebuiltConfigs():
   return boards
 
 
+def CompatIdsToString(compat_ids):
+  """Get a JSON representation of a dict mapping BoardKeys to CompatIds.
+
+  Args:
+    compat_ids: A dict mapping BoardKey objects to CompatId objects.
+  """
+  output = [{'key': key.__dict__, 'compat_id': compat_id.__dict__}
+            for key, compat_id in compat_ids.iteritems()]
+  return json.dumps(output, sort_keys=True, indent=2)
+
+
+def CompatIdsFromString(data):
+  """Load a dict mapping BoardKeys to CompatIds from a JSON string.
+
+  Args:
+    data: A JSON string, as returned by CompatIdsToString.
+  """
+  compat_ids = {}
+  for d in json.loads(data):
+    compat_ids[BoardKey(**d['key'])] = CompatId(**d['compat_id'])
+  return compat_ids
+
+
 # A tuple of dicts describing our Chrome PFQs.
 # by_compat_id: A dict mapping CompatIds to sets of BoardKey objects.
 # by_arch_useflags: A dict mapping (arch, useflags) tuples to sets of
@@ -137,24 +160,42 @@ class PrebuiltMapping(_PrebuiltMapping):
       configs.by_arch_useflags[partial_compat_id].add(key)
     return configs
 
-  def Dump(self, filename, internal=True):
-    """Save a mapping of the Chrome PFQ configs to disk (JSON format).
+  def DumpToString(self, internal=True):
+    """Get a JSON representation of the Chrome PFQ configs.
 
     Args:
-      filename: A location to write the Chrome PFQ configs.
       internal: Whether the dump should include internal configurations.
     """
-    output = []
+    compat_ids = {}
     for compat_id, keys in self.by_compat_id.items():
       for key in keys:
         # Filter internal prebuilts out of external dumps.
         if not internal and 'chrome_internal' in key.useflags:
           continue
 
-        output.append({'key': key.__dict__, 'compat_id': compat_id.__dict__})
+        compat_ids[key] = compat_id
+
+    return CompatIdsToString(compat_ids)
+
+  def Dump(self, filename, internal=True):
+    """Save a mapping of the Chrome PFQ configs to disk (JSON format).
 
+    Args:
+      filename: A location to write the Chrome PFQ configs.
+      internal: Whether the dump should include internal configurations.
+    """
     with open(filename, 'w') as f:
-      json.dump(output, f, sort_keys=True, indent=2)
+      f.write(self.DumpToString(internal=internal))
+
+  @classmethod
+  def LoadFromString(cls, data):
+    """Load a mapping of the Chrome PFQ configs from a JSON string.
+
+    Args:
+      data: The JSON representation of the Chrome PFQ configs.
+    """
+    compat_ids = CompatIdsFromString(data)
+    return cls.Get(compat_ids.keys(), compat_ids)
 
   @classmethod
   def Load(cls, filename):
@@ -164,14 +205,7 @@ class PrebuiltMapping(_PrebuiltMapping):
       filename: A location to read the Chrome PFQ configs from.
     """
     with open(filename) as f:
-      output = json.load(f)
-
-    compat_ids = {}
-    for d in output:
-      key = BoardKey(**d['key'])
-      compat_ids[key] = CompatId(**d['compat_id'])
-
-    return cls.Get(compat_ids.keys(), compat_ids)
+      return cls.LoadFromString(f.read())
 
   def GetPrebuilts(self, compat_id):
     """Get the matching BoardKey objects associated with |compat_id|.
@@ -280,7 +314,6 @@ class CompatIdFetcher(object):
       caching: Whether to cache setup from run to run. See
         PrebuiltCompatibilityTest.CACHING for details.
     """
-    self.compat_ids = None
     if caching:
       # This import occurs here rather than at the top of the file because we
       # don't want to force developers to install joblib. The caching argument
@@ -291,19 +324,17 @@ class CompatIdFetcher(object):
       memory = Memory(cachedir=tempfile.gettempdir(), verbose=0)
       self.FetchCompatIds = memory.cache(self.FetchCompatIds)
 
-  def _FetchCompatId(self, board, extra_useflags):
-    self.compat_ids[(board, extra_useflags)] = (
-        CalculateCompatId(board, extra_useflags))
-
   def FetchCompatIds(self, board_keys):
     """Generate a dict mapping BoardKeys to their associated CompatId.
 
+    The CompatIds are calculated in a pool of processes, since each one is
+    bound by the latency of the portage queries it runs.
+
     Args:
       board_keys: A list of BoardKey objects to fetch.
     """
     # pylint: disable=method-hidden
     logging.info('Fetching CompatId objects...')
-    with parallel.Manager() as manager:
-      self.compat_ids = manager.dict()
-      parallel.RunTasksInProcessPool(self._FetchCompatId, board_keys)
-      return dict(self.compat_ids)
+    board_keys = list(board_keys)
+    compat_ids = parallel.RunTasksInProcessPool(CalculateCompatId, board_keys)
+    return dict(zip(board_keys, compat_ids))
@@ -7,7 +7,8 @@
 from __future__ import print_function
 
 import collections
-import inspect
+import hashlib
+import multiprocessing
 import os
 import unittest
 import warnings
@@ -19,6 +20,8 @@ from chromite.lib import cros_build_lib
 from chromite.lib import cros_logging as logging
 from chromite.lib import cros_test_lib
 from chromite.lib import osutils
+from chromite.lib import parallel
+from chromite.lib import path_util
 
 
 class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
@@ -27,26 +30,90 @@ class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
   # Whether to cache setup from run to run. If set, requires that you install
   # joblib (sudo easy_install joblib). This is useful for iterating on the
   # unit tests, but note that if you 'repo sync', you'll need to clear out
-  # /tmp/joblib and blow away /build in order to update the caches. Note that
-  # this is never normally set to True -- if you want to use this feature,
-  # you'll need to hand-edit this file.
+  # /tmp/joblib and blow away /build in order to update the caches. CompatIds
+  # are also cached in the chromite cache dir, keyed by the pinned manifest;
+  # local overlay changes are not detected there. Note that this is never
+  # normally set to True -- if you want to use this feature, you'll need to
+  # hand-edit this file.
   # TODO(davidjames): Add a --caching option.
   CACHING = False
 
   # A dict mapping BoardKeys to their associated compat ids.
   COMPAT_IDS = None
 
+  # The global cbuildbot config, loaded once for all tests.
+  CONFIG = None
+
+  # A PrebuiltMapping object for the current Chrome PFQ configs. This is shared
+  # by all tests, so it must not be modified.
+  DEFAULT_PFQ_CONFIGS = None
+
+  @classmethod
+  def GetCompatIdCacheFilename(cls, board_keys):
+    """Get the filename where CompatIds for |board_keys| are cached.
+
+    The cache is keyed by the revision-locked manifest of the checkout, so it
+    is invalidated whenever any project is synced. Local, uncommitted changes
+    to the overlays are not detected.
+
+    Args:
+      board_keys: A list of BoardKey objects.
+    """
+    manifest = cros_build_lib.RunCommand(
+        ['repo', 'manifest', '-r', '-o', '-'], cwd=constants.SOURCE_ROOT,
+        print_cmd=False, capture_output=True,
+        extra_env={'PAGER': 'cat'}).output
+    digest = hashlib.sha1(manifest)
+    digest.update(repr(sorted(board_keys)))
+    return os.path.join(path_util.GetCacheDir(), 'compat_ids',
+                        '%s.json' % digest.hexdigest())
+
+  @classmethod
+  def LoadCompatIdCache(cls, filename):
+    """Load a dict mapping BoardKeys to CompatIds from |filename|.
+
+    Returns:
+      The cached dict, or an empty dict if there is no usable cache.
+    """
+    try:
+      return binhost.CompatIdsFromString(osutils.ReadFile(filename))
+    except (IOError, ValueError):
+      return {}
+
+  @classmethod
+  def SaveCompatIdCache(cls, filename, compat_ids):
+    """Save a dict mapping BoardKeys to CompatIds to |filename|."""
+    osutils.WriteFile(filename, binhost.CompatIdsToString(compat_ids),
+                      atomic=True, makedirs=True)
+
   @classmethod
   def setUpClass(cls):
     assert cros_build_lib.IsInsideChroot()
-    logging.info('Generating board configs. This takes about 10m...')
     board_keys = binhost.GetAllImportantBoardKeys()
-    boards = set(key.board for key in board_keys)
-    for board in sorted(boards):
-      binhost.GenConfigsForBoard(board, regen=not cls.CACHING,
-                                 error_code_ok=False)
-    fetcher = binhost.CompatIdFetcher(caching=cls.CACHING)
-    cls.COMPAT_IDS = fetcher.FetchCompatIds(list(board_keys))
+    cls.COMPAT_IDS = {}
+    if cls.CACHING:
+      cache_filename = cls.GetCompatIdCacheFilename(board_keys)
+      cls.COMPAT_IDS = cls.LoadCompatIdCache(cache_filename)
+    missing = [key for key in board_keys if key not in cls.COMPAT_IDS]
+    if missing:
+      logging.info('Generating board configs. This takes about 10m...')
+    boards = sorted(set(key.board for key in board_keys))
+    # Each board has its own sysroot, so the boards can be set up in parallel.
+    # If any board fails, RunTasksInProcessPool raises a BackgroundFailure
+    # containing the traceback for that board.
+    gen_config = lambda board: binhost.GenConfigsForBoard(
+        board, regen=not cls.CACHING, error_code_ok=False)
+    parallel.RunTasksInProcessPool(gen_config,
+                                   [[board] for board in boards],
+                                   processes=multiprocessing.cpu_count())
+    if missing:
+      fetcher = binhost.CompatIdFetcher(caching=cls.CACHING)
+      cls.COMPAT_IDS.update(fetcher.FetchCompatIds(missing))
+      if cls.CACHING:
+        cls.SaveCompatIdCache(cache_filename, cls.COMPAT_IDS)
+    cls.CONFIG = cbuildbot_config.GetConfig()
+    keys = binhost.GetChromePrebuiltConfigs().keys()
+    cls.DEFAULT_PFQ_CONFIGS = binhost.PrebuiltMapping.Get(keys, cls.COMPAT_IDS)
 
   def setUp(self):
     self.complaints = []
@@ -90,18 +157,18 @@ class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
       assert expected == actual
       return 'no differences'
 
-  def AssertChromePrebuilts(self, pfq_configs, config):
+  def AssertChromePrebuilts(self, pfq_configs, config, compat_id):
     """Verify that the specified config has Chrome prebuilts.
 
     Args:
       pfq_configs: A PrebuiltMapping object.
       config: The config to check.
+      compat_id: The CompatId of |config|.
     """
-    compat_id = self.GetCompatId(config)
-    pfqs = pfq_configs.by_compat_id.get(compat_id, set())
-    if not pfqs:
+    matched = bool(pfq_configs.by_compat_id.get(compat_id))
+    if not matched:
       arch_useflags = (compat_id.arch, compat_id.useflags)
-      for key in pfq_configs.by_arch_useflags[arch_useflags]:
+      for key in pfq_configs.by_arch_useflags.get(arch_useflags, ()):
         # If there wasn't an exact match for this CompatId, but there
         # was an (arch, useflags) match, then we'll be using mismatched
         # Chrome prebuilts. Complain.
@@ -111,9 +178,9 @@ class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
         err = self.GetCompatIdDiff(compat_id, pfq_compat_id)
         msg = '%s uses mismatched Chrome prebuilts from %s -- %s'
         self.Complain(msg % (config.name, key.board, err), fatal=False)
-        pfqs.add(key)
+        matched = True
 
-    if not pfqs:
+    if not matched:
       pre_cq = (config.build_type == cbuildbot_config.CONFIG_TYPE_PRECQ)
       msg = '%s cannot find Chrome prebuilts -- %s'
       self.Complain(msg % (config.name, compat_id),
@@ -150,8 +217,7 @@ class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
     if filename is not None:
       pfq_configs = binhost.PrebuiltMapping.Load(filename)
     else:
-      keys = binhost.GetChromePrebuiltConfigs().keys()
-      pfq_configs = binhost.PrebuiltMapping.Get(keys, self.COMPAT_IDS)
+      pfq_configs = self.DEFAULT_PFQ_CONFIGS
 
     for compat_id, pfqs in pfq_configs.by_compat_id.items():
       if len(pfqs) > 1:
@@ -159,16 +225,18 @@ class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
         self.Complain(msg % (', '.join(str(x) for x in pfqs), compat_id),
                       fatal=False)
 
-    for _name, config in sorted(cbuildbot_config.GetConfig().items()):
+    precq = cbuildbot_config.CONFIG_TYPE_PRECQ
+    for _name, config in sorted(self.CONFIG.items()):
       # Skip over configs that don't have Chrome or have >1 board.
       if config.sync_chrome is False or len(config.boards) != 1:
         continue
 
       # Look for boards with missing prebuilts.
-      pre_cq = (config.build_type == cbuildbot_config.CONFIG_TYPE_PRECQ)
+      pre_cq = (config.build_type == precq)
       if ((config.usepkg_build_packages and not config.chrome_rev) and
           (config.active_waterfall or pre_cq)):
-        self.AssertChromePrebuilts(pfq_configs, config)
+        self.AssertChromePrebuilts(pfq_configs, config,
+                                   self.GetCompatId(config))
 
   def testCurrentChromePrebuiltsEnough(self):
     """Verify Chrome prebuilts exist for all configs that build Chrome.
@@ -187,7 +255,7 @@ class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
     This means that all of the subconfigs in the release group have matching
     use flags, cflags, and architecture.
     """
-    for config in cbuildbot_config.GetConfig().values():
+    for config in self.CONFIG.values():
       # Only test release groups.
       if not config.name.endswith('-release-group'):
         continue
@@ -201,7 +269,7 @@ class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
             compat_ids_for_config[compat_id].add(board)
 
       if len(compat_ids_for_config) > 1:
-        arch_useflags = set(tuple(x[:-1]) for x in compat_ids_for_config)
+        arch_useflags = set((x.arch, x.useflags) for x in compat_ids_for_config)
         if len(arch_useflags) > 1:
           # If two configs in the same group have mismatched Chrome binaries
           # (e.g. different use flags), Chrome may be built twice in parallel
@@ -225,12 +293,9 @@ class PrebuiltCompatibilityTest(cros_test_lib.TestCase):
     This loads the list of Chrome prebuilts that were generated during the last
     Chrome PFQ run from disk and verifies that it is sufficient.
     """
-    with osutils.TempDir() as tempdir:
-      keys = binhost.GetChromePrebuiltConfigs().keys()
-      pfq_configs = binhost.PrebuiltMapping.Get(keys, self.COMPAT_IDS)
-      filename = os.path.join(tempdir, 'foo.json')
-      pfq_configs.Dump(filename)
-      self.assertEqual(pfq_configs, binhost.PrebuiltMapping.Load(filename))
+    pfq_configs = self.DEFAULT_PFQ_CONFIGS
+    data = pfq_configs.DumpToString()
+    self.assertEqual(pfq_configs, binhost.PrebuiltMapping.LoadFromString(data))
 
 
 def NoIncremental():
@@ -243,9 +308,8 @@ def NoIncremental():
     A unittest.TestSuite that does not contain any incremental tests.
   """
   suite = unittest.TestSuite()
-  method_names = [f[0] for f in inspect.getmembers(PrebuiltCompatibilityTest,
-                                                   predicate=inspect.ismethod)]
-  for m in method_names:
-    if m.startswith('test') and m != 'testCurrentChromePrebuiltsEnough':
+  loader = unittest.TestLoader()
+  for m in loader.getTestCaseNames(PrebuiltCompatibilityTest):
+    if m != 'testCurrentChromePrebuiltsEnough':
       suite.addTest(PrebuiltCompatibilityTest(m))
   return suite
@@ -51,7 +51,24 @@ class Builder(object):
 
     self.archive_stages = {}
     self.patch_pool = trybot_patch_pool.TrybotPatchPool()
-    self._build_image_lock = multiprocessing.Lock()
+    self._build_image_lock_obj = None
+
+  def _AllocateBuildImageLock(self):
+    """Allocate the lock used to serialize image builds.
+
+    The lock is only allocated by builders that build images in parallel. This
+    must be called before forking the background processes that use it, so
+    that they all share the same lock.
+    """
+    if self._build_image_lock_obj is None:
+      self._build_image_lock_obj = multiprocessing.Lock()
+
+  @property
+  def _build_image_lock(self):
+    """Lock used to serialize image builds across background processes."""
+    assert self._build_image_lock_obj is not None, (
+        '_AllocateBuildImageLock() must be called before forking')
+    return self._build_image_lock_obj
 
   def Initialize(self):
     """Runs through the initialization steps of an actual build."""
@@ -121,10 +138,11 @@ class Builder(object):
       # results (e.g. because it was killed before it could report the
       # results.) In this case, attribute the exception to any stages that
       # didn't report back correctly (if any).
+      results = results_lib.Results
       for stage in stage_objs:
         for name in stage.GetStageNames():
-          if not results_lib.Results.StageHasResults(name):
-            results_lib.Results.Record(name, ex, str(ex))
+          if not results.StageHasResults(name):
+            results.Record(name, ex, str(ex))
 
       if cidb.CIDBConnectionFactory.IsCIDBSetup():
         db = cidb.CIDBConnectionFactory.GetCIDBConnectionForBuilder()
@@ -219,9 +237,13 @@ class Builder(object):
     if not self._run.options.cache_dir_specified:
       commandline.BaseParser.ConfigureCacheDir(None)
 
-    with tempfile.NamedTemporaryFile(prefix='metadata') as metadata_file:
-      metadata_file.write(self._run.attrs.metadata.GetJSON())
-      metadata_file.flush()
+    # The metadata is serialized once up front and written as raw bytes with an
+    # unbuffered file, so it goes straight to disk in a single pass without
+    # being chunked through the stdio buffer.
+    payload = self._run.attrs.metadata.GetJSON()
+    with tempfile.NamedTemporaryFile(prefix='metadata', mode='wb',
+                                     bufsize=0) as metadata_file:
+      metadata_file.write(payload)
       args += ['--metadata_dump', metadata_file.name]
 
       # Re-run the command in the buildroot.
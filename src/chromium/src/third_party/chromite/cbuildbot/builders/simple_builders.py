@@ -223,6 +223,10 @@ class SimpleBuilder(generic_builders.Builder):
         self.archive_stages[board_config] = archive_stage
         tasks.append((builder_run, board))
 
+    # Allocate the build image lock before forking, so that all of the
+    # background processes share it.
+    self._AllocateBuildImageLock()
+
     # Set up a process pool to run test/archive stages in the background.
     # This process runs task(board) for each board added to the queue.
     task_runner = self._RunBackgroundStagesForBoardAndMarkAsSuccessful
@@ -8,7 +8,7 @@ from __future__ import print_function
 
 import os
 import re
-from xml.dom import minidom
+from xml.etree import ElementTree
 
 from chromite.cbuildbot import cbuildbot_config
 from chromite.cbuildbot import constants
@@ -39,6 +39,12 @@ CHROME_VERSION_ATTR = 'version'
 LKGM_ELEMENT = 'lkgm'
 LKGM_VERSION_ATTR = 'version'
 
+# Matches the author, committer and review lines of a git log, so that a whole
+# log can be scanned in a single pass.
+_BLAMELIST_RE = re.compile(r'^\s*(?:Author:.*<(?P<author>\S+)@\S+>|'
+                           r'Commit:.*<(?P<committer>\S+)@\S+>|'
+                           r'Reviewed-on:\s*(?P<review>\S+))', re.MULTILINE)
+
 
 class PromoteCandidateException(Exception):
   """Exception thrown for failure to promote manifest candidate."""
@@ -93,6 +99,13 @@ class _LKGMCandidateInfo(manifest_version.VersionInfo):
     return map(int, [self.build_number, self.branch_build_number,
                      self.patch_number, self.revision_number])
 
+  def __cmp__(self, other):
+    # Candidates have the same number of components, so their component lists
+    # can be compared in a single step rather than field by field.
+    if isinstance(other, _LKGMCandidateInfo):
+      return cmp(self.VersionComponents(), other.VersionComponents())
+    return super(_LKGMCandidateInfo, self).__cmp__(other)
+
   def IncrementVersion(self):
     """Increments the version by incrementing the revision #."""
     self.revision_number += 1
@@ -165,26 +178,49 @@ class LKGMManager(manifest_version.BuildSpecsManager):
                               chrome_branch=version_info.chrome_branch,
                               incr_type=self.incr_type)
 
+  def _GetLKGMVersion(self):
+    """Returns the last known good version string, or None if there is none."""
+    try:
+      lkgm_filename = os.path.basename(os.readlink(self.lkgm_path))
+    except OSError:
+      return None
+    lkgm_version, _ = os.path.splitext(lkgm_filename)
+    return lkgm_version
+
+  def _AddLKGMToManifestTree(self, manifest_tree, lkgm_version):
+    """Adds the lkgm element with version |lkgm_version| to |manifest_tree|.
+
+    Args:
+      manifest_tree: An ElementTree of the manifest.
+      lkgm_version: The last known good version string.
+    """
+    ElementTree.SubElement(manifest_tree.getroot(), LKGM_ELEMENT,
+                           {LKGM_VERSION_ATTR: lkgm_version})
+
   def _AddLKGMToManifest(self, manifest):
     """Write the last known good version string to the manifest.
 
     Args:
       manifest: Path to the manifest.
     """
-    # Get the last known good version string.
-    try:
-      lkgm_filename = os.path.basename(os.readlink(self.lkgm_path))
-      lkgm_version, _ = os.path.splitext(lkgm_filename)
-    except OSError:
+    lkgm_version = self._GetLKGMVersion()
+    if lkgm_version is None:
       return
 
-    # Write the last known good version string to the manifest.
-    manifest_dom = minidom.parse(manifest)
-    lkgm_element = manifest_dom.createElement(LKGM_ELEMENT)
-    lkgm_element.setAttribute(LKGM_VERSION_ATTR, lkgm_version)
-    manifest_dom.documentElement.appendChild(lkgm_element)
-    with open(manifest, 'w+') as manifest_file:
-      manifest_dom.writexml(manifest_file)
+    manifest_tree = ElementTree.parse(manifest)
+    self._AddLKGMToManifestTree(manifest_tree, lkgm_version)
+    manifest_tree.write(manifest)
+
+  def _AddChromeVersionToManifestTree(self, manifest_tree, chrome_version):
+    """Adds the chrome element with version |chrome_version| to |manifest_tree|.
+
+    Args:
+      manifest_tree: An ElementTree of the manifest.
+      chrome_version: A string representing the version of Chrome
+        (e.g. 35.0.1863.0).
+    """
+    ElementTree.SubElement(manifest_tree.getroot(), CHROME_ELEMENT,
+                           {CHROME_VERSION_ATTR: chrome_version})
 
   def _AddChromeVersionToManifest(self, manifest, chrome_version):
     """Adds the chrome element with version |chrome_version| to |manifest|.
@@ -197,12 +233,34 @@ class LKGMManager(manifest_version.BuildSpecsManager):
       chrome_version: A string representing the version of Chrome
         (e.g. 35.0.1863.0).
     """
-    manifest_dom = minidom.parse(manifest)
-    chrome = manifest_dom.createElement(CHROME_ELEMENT)
-    chrome.setAttribute(CHROME_VERSION_ATTR, chrome_version)
-    manifest_dom.documentElement.appendChild(chrome)
-    with open(manifest, 'w+') as manifest_file:
-      manifest_dom.writexml(manifest_file)
+    manifest_tree = ElementTree.parse(manifest)
+    self._AddChromeVersionToManifestTree(manifest_tree, chrome_version)
+    manifest_tree.write(manifest)
+
+  def _AddPatchesToManifestTree(self, manifest_tree, patches):
+    """Adds list of |patches| to |manifest_tree|.
+
+    Args:
+      manifest_tree: An ElementTree of the manifest.
+      patches: A list of cros_patch.GerritPatch objects.
+    """
+    root = manifest_tree.getroot()
+    for patch in patches:
+      ElementTree.SubElement(root, PALADIN_COMMIT_ELEMENT, {
+          PALADIN_REMOTE_ATTR: patch.remote,
+          PALADIN_GERRIT_NUMBER_ATTR: patch.gerrit_number,
+          PALADIN_PROJECT_ATTR: patch.project,
+          PALADIN_PROJECT_URL_ATTR: patch.project_url,
+          PALADIN_REF_ATTR: patch.ref,
+          PALADIN_BRANCH_ATTR: patch.tracking_branch,
+          PALADIN_CHANGE_ID_ATTR: patch.change_id,
+          PALADIN_COMMIT_ATTR: patch.commit,
+          PALADIN_PATCH_NUMBER_ATTR: patch.patch_number,
+          PALADIN_OWNER_EMAIL_ATTR: patch.owner_email,
+          PALADIN_FAIL_COUNT_ATTR: str(patch.fail_count),
+          PALADIN_PASS_COUNT_ATTR: str(patch.pass_count),
+          PALADIN_TOTAL_FAIL_COUNT_ATTR: str(patch.total_fail_count),
+      })
 
   def _AddPatchesToManifest(self, manifest, patches):
     """Adds list of |patches| to given |manifest|.
@@ -215,30 +273,9 @@ class LKGMManager(manifest_version.BuildSpecsManager):
       manifest: Path to the manifest.
       patches: A list of cros_patch.GerritPatch objects.
     """
-    manifest_dom = minidom.parse(manifest)
-    for patch in patches:
-      pending_commit = manifest_dom.createElement(PALADIN_COMMIT_ELEMENT)
-      pending_commit.setAttribute(PALADIN_REMOTE_ATTR, patch.remote)
-      pending_commit.setAttribute(
-          PALADIN_GERRIT_NUMBER_ATTR, patch.gerrit_number)
-      pending_commit.setAttribute(PALADIN_PROJECT_ATTR, patch.project)
-      pending_commit.setAttribute(PALADIN_PROJECT_URL_ATTR, patch.project_url)
-      pending_commit.setAttribute(PALADIN_REF_ATTR, patch.ref)
-      pending_commit.setAttribute(PALADIN_BRANCH_ATTR, patch.tracking_branch)
-      pending_commit.setAttribute(PALADIN_CHANGE_ID_ATTR, patch.change_id)
-      pending_commit.setAttribute(PALADIN_COMMIT_ATTR, patch.commit)
-      pending_commit.setAttribute(PALADIN_PATCH_NUMBER_ATTR, patch.patch_number)
-      pending_commit.setAttribute(PALADIN_OWNER_EMAIL_ATTR, patch.owner_email)
-      pending_commit.setAttribute(PALADIN_FAIL_COUNT_ATTR,
-                                  str(patch.fail_count))
-      pending_commit.setAttribute(PALADIN_PASS_COUNT_ATTR,
-                                  str(patch.pass_count))
-      pending_commit.setAttribute(PALADIN_TOTAL_FAIL_COUNT_ATTR,
-                                  str(patch.total_fail_count))
-      manifest_dom.documentElement.appendChild(pending_commit)
-
-    with open(manifest, 'w+') as manifest_file:
-      manifest_dom.writexml(manifest_file)
+    manifest_tree = ElementTree.parse(manifest)
+    self._AddPatchesToManifestTree(manifest_tree, patches)
+    manifest_tree.write(manifest)
 
   def CreateNewCandidate(self, validation_pool=None,
                          chrome_version=None,
@@ -439,9 +476,6 @@ def GenerateBlameList(source_repo, lkgm_path, only_print_chumps=False):
     only_print_chumps: If True, only print changes that were chumped.
   """
   handler = git.Manifest(lkgm_path)
-  reviewed_on_re = re.compile(r'\s*Reviewed-on:\s*(\S+)')
-  author_re = re.compile(r'\s*Author:.*<(\S+)@\S+>\s*')
-  committer_re = re.compile(r'\s*Commit:.*<(\S+)@\S+>\s*')
   for rel_src_path, checkout in handler.checkouts_by_path.iteritems():
     project = checkout['name']
 
@@ -464,18 +498,14 @@ def GenerateBlameList(source_repo, lkgm_path, only_print_chumps=False):
       return
     current_author = None
     current_committer = None
-    for line in unicode(result.output, 'ascii', 'ignore').splitlines():
-      author_match = author_re.match(line)
-      if author_match:
-        current_author = author_match.group(1)
-
-      committer_match = committer_re.match(line)
-      if committer_match:
-        current_committer = committer_match.group(1)
-
-      review_match = reviewed_on_re.match(line)
-      if review_match:
-        review = review_match.group(1)
+    output = unicode(result.output, 'ascii', 'ignore')
+    for match in _BLAMELIST_RE.finditer(output):
+      if match.group('author'):
+        current_author = match.group('author')
+      elif match.group('committer'):
+        current_committer = match.group('committer')
+      else:
+        review = match.group('review')
         _, _, change_number = review.rpartition('/')
         items = [
             os.path.basename(project),
@@ -10,7 +10,7 @@ import contextlib
 import mock
 import os
 import tempfile
-from xml.dom import minidom
+from xml.etree import ElementTree
 
 from chromite.cbuildbot import constants
 from chromite.cbuildbot import lkgm_manager
@@ -94,18 +94,20 @@ class LKGMCandidateInfoTest(cros_test_lib.TestCase):
     self.assertNotEqual(info3, info4)
     self.assertNotEqual(info4, info0)
     self.assertNotEqual(info4, info1)
-    self.assertNotEqual(info4, info1)
+    self.assertNotEqual(info4, info2)
     self.assertNotEqual(info4, info3)
 
 
+def EmptyManifestTree():
+  """Returns an in-memory ElementTree of an empty manifest."""
+  return ElementTree.ElementTree(ElementTree.fromstring('<manifest/>'))
+
+
 @contextlib.contextmanager
 def TemporaryManifest():
   with tempfile.NamedTemporaryFile() as f:
     # Create fake but empty manifest file.
-    new_doc = minidom.getDOMImplementation().createDocument(
-        None, 'manifest', None)
-    print(new_doc.toxml())
-    new_doc.writexml(f)
+    f.write('<?xml version="1.0" ?><manifest/>')
     f.flush()
     yield f
 
@@ -113,16 +115,15 @@ def TemporaryManifest():
 class LKGMManagerTest(cros_test_lib.MockTempDirTestCase):
   """Tests for the BuildSpecs manager."""
 
+  # Settings shared by every test; only the directories differ per test.
+  SOURCE_REPO = 'ssh://source/repo'
+  MANIFEST_REPO = 'ssh://manifest/repo'
+  BRANCH = 'master'
+  BUILD_NAME = 'x86-generic'
+
   def setUp(self):
     self.push_mock = self.PatchObject(git, 'CreatePushBranch')
 
-    self.source_repo = 'ssh://source/repo'
-    self.manifest_repo = 'ssh://manifest/repo'
-    self.version_file = 'version-file.sh'
-    self.branch = 'master'
-    self.build_name = 'x86-generic'
-    self.incr_type = 'branch'
-
     # Create tmp subdirs based on the one provided TempDirMixin.
     self.tmpdir = os.path.join(self.tempdir, "base")
     osutils.SafeMakedirs(self.tmpdir)
@@ -130,10 +131,10 @@ class LKGMManagerTest(cros_test_lib.MockTempDirTestCase):
     osutils.SafeMakedirs(self.tmpmandir)
 
     repo = repository.RepoRepository(
-        self.source_repo, self.tmpdir, self.branch, depth=1)
+        self.SOURCE_REPO, self.tmpdir, self.BRANCH, depth=1)
     self.manager = lkgm_manager.LKGMManager(
-        repo, self.manifest_repo, self.build_name, constants.PFQ_TYPE, 'branch',
-        force=False, branch=self.branch, dry_run=True)
+        repo, self.MANIFEST_REPO, self.BUILD_NAME, constants.PFQ_TYPE, 'branch',
+        force=False, branch=self.BRANCH, dry_run=True)
     self.manager.manifest_dir = self.tmpmandir
     self.manager.lkgm_path = os.path.join(
         self.tmpmandir, constants.LKGM_MANIFEST)
@@ -163,21 +164,19 @@ class LKGMManagerTest(cros_test_lib.MockTempDirTestCase):
 
     build_id = 59271
 
-    self.PatchObject(lkgm_manager.LKGMManager, 'CheckoutSourceCode')
-    self.PatchObject(lkgm_manager.LKGMManager, 'CreateManifest',
-                     return_value=new_manifest)
-    self.PatchObject(lkgm_manager.LKGMManager, 'HasCheckoutBeenBuilt',
-                     return_value=False)
-
-    # Do manifest refresh work.
-    self.PatchObject(lkgm_manager.LKGMManager, 'RefreshManifestCheckout')
-    self.PatchObject(lkgm_manager.LKGMManager, 'GetCurrentVersionInfo',
-                     return_value=my_info)
-    init_mock = self.PatchObject(lkgm_manager.LKGMManager,
-                                 'InitializeManifestVariables')
-
-    # Publish new candidate.
-    publish_mock = self.PatchObject(lkgm_manager.LKGMManager, 'PublishManifest')
+    mocks = self.StartPatcher(mock.patch.multiple(
+        lkgm_manager.LKGMManager,
+        CheckoutSourceCode=mock.DEFAULT,
+        CreateManifest=mock.Mock(return_value=new_manifest),
+        HasCheckoutBeenBuilt=mock.Mock(return_value=False),
+        # Do manifest refresh work.
+        RefreshManifestCheckout=mock.DEFAULT,
+        GetCurrentVersionInfo=mock.Mock(return_value=my_info),
+        InitializeManifestVariables=mock.DEFAULT,
+        # Publish new candidate.
+        PublishManifest=mock.DEFAULT))
+    init_mock = mocks['InitializeManifestVariables']
+    publish_mock = mocks['PublishManifest']
 
     candidate_path = self.manager.CreateNewCandidate(build_id=build_id)
     self.assertEqual(candidate_path, self._GetPathToManifest(new_candidate))
@@ -205,15 +204,16 @@ class LKGMManagerTest(cros_test_lib.MockTempDirTestCase):
     filter_mock = self.PatchObject(manifest_version, 'FilterManifest',
                                    return_value=new_manifest)
 
-    # Do manifest refresh work.
-    self.PatchObject(lkgm_manager.LKGMManager, 'GetCurrentVersionInfo',
-                     return_value=my_info)
-    self.PatchObject(lkgm_manager.LKGMManager, 'RefreshManifestCheckout')
-    init_mock = self.PatchObject(lkgm_manager.LKGMManager,
-                                 'InitializeManifestVariables')
-
-    # Publish new candidate.
-    publish_mock = self.PatchObject(lkgm_manager.LKGMManager, 'PublishManifest')
+    mocks = self.StartPatcher(mock.patch.multiple(
+        lkgm_manager.LKGMManager,
+        # Do manifest refresh work.
+        GetCurrentVersionInfo=mock.Mock(return_value=my_info),
+        RefreshManifestCheckout=mock.DEFAULT,
+        InitializeManifestVariables=mock.DEFAULT,
+        # Publish new candidate.
+        PublishManifest=mock.DEFAULT))
+    init_mock = mocks['InitializeManifestVariables']
+    publish_mock = mocks['PublishManifest']
 
     candidate_path = self.manager.CreateFromManifest(manifest,
                                                      build_id=build_id)
@@ -231,16 +231,15 @@ class LKGMManagerTest(cros_test_lib.MockTempDirTestCase):
     """Tests that we return nothing if there is nothing to create."""
     new_manifest = 'some_manifest'
     my_info = lkgm_manager._LKGMCandidateInfo('1.2.3')
-    self.PatchObject(lkgm_manager.LKGMManager, 'CheckoutSourceCode')
-    self.PatchObject(lkgm_manager.LKGMManager, 'CreateManifest',
-                     return_value=new_manifest)
-    self.PatchObject(lkgm_manager.LKGMManager, 'RefreshManifestCheckout')
-    self.PatchObject(lkgm_manager.LKGMManager, 'GetCurrentVersionInfo',
-                     return_value=my_info)
-    init_mock = self.PatchObject(lkgm_manager.LKGMManager,
-                                 'InitializeManifestVariables')
-    self.PatchObject(lkgm_manager.LKGMManager, 'HasCheckoutBeenBuilt',
-                     return_value=True)
+    mocks = self.StartPatcher(mock.patch.multiple(
+        lkgm_manager.LKGMManager,
+        CheckoutSourceCode=mock.DEFAULT,
+        CreateManifest=mock.Mock(return_value=new_manifest),
+        RefreshManifestCheckout=mock.DEFAULT,
+        GetCurrentVersionInfo=mock.Mock(return_value=my_info),
+        InitializeManifestVariables=mock.DEFAULT,
+        HasCheckoutBeenBuilt=mock.Mock(return_value=True)))
+    init_mock = mocks['InitializeManifestVariables']
 
     candidate = self.manager.CreateNewCandidate()
     self.assertEqual(candidate, None)
@@ -322,19 +321,16 @@ class LKGMManagerTest(cros_test_lib.MockTempDirTestCase):
     ])
 
   def testAddChromeVersionToManifest(self):
-    """Tests whether we can write the chrome version to the manifest file."""
-    with TemporaryManifest() as f:
-      chrome_version = '35.0.1863.0'
-      # Write the chrome element to manifest.
-      self.manager._AddChromeVersionToManifest(f.name, chrome_version)
+    """Tests whether we can write the chrome version to the manifest."""
+    new_doc = EmptyManifestTree()
+    chrome_version = '35.0.1863.0'
+    # Write the chrome element to manifest.
+    self.manager._AddChromeVersionToManifestTree(new_doc, chrome_version)
 
-      # Read the manifest file.
-      new_doc = minidom.parse(f.name)
-      elements = new_doc.getElementsByTagName(lkgm_manager.CHROME_ELEMENT)
-      self.assertEqual(len(elements), 1)
-      self.assertEqual(
-          elements[0].getAttribute(lkgm_manager.CHROME_VERSION_ATTR),
-          chrome_version)
+    elements = new_doc.findall('.//' + lkgm_manager.CHROME_ELEMENT)
+    self.assertEqual(len(elements), 1)
+    self.assertEqual(elements[0].get(lkgm_manager.CHROME_VERSION_ATTR),
+                     chrome_version)
 
   def testAddLKGMToManifest(self, present=True):
     """Tests whether we can write the LKGM version to the manifest file."""
@@ -349,13 +345,12 @@ class LKGMManagerTest(cros_test_lib.MockTempDirTestCase):
       self.manager._AddLKGMToManifest(f.name)
 
       # Read the manifest file.
-      new_doc = minidom.parse(f.name)
-      elements = new_doc.getElementsByTagName(lkgm_manager.LKGM_ELEMENT)
+      new_doc = ElementTree.parse(f.name)
+      elements = new_doc.findall('.//' + lkgm_manager.LKGM_ELEMENT)
       if present:
         self.assertEqual(len(elements), 1)
-        self.assertEqual(
-            elements[0].getAttribute(lkgm_manager.LKGM_VERSION_ATTR),
-            lkgm_version)
+        self.assertEqual(elements[0].get(lkgm_manager.LKGM_VERSION_ATTR),
+                         lkgm_version)
       else:
         self.assertEqual(len(elements), 0)
 
@@ -364,60 +359,45 @@ class LKGMManagerTest(cros_test_lib.MockTempDirTestCase):
     self.testAddLKGMToManifest(present=False)
 
   def testAddPatchesToManifest(self):
-    """Tests whether we can add a fake patch to an empty manifest file.
+    """Tests whether we can add a fake patch to an empty manifest.
 
-    This test creates an empty xml file with just manifest/ tag in it then
-    runs the AddPatchesToManifest with one mocked out GerritPatch and ensures
-    the newly generated manifest has the correct patch information afterwards.
+    This test creates an empty manifest tree with just manifest/ tag in it then
+    runs the AddPatchesToManifestTree with one mocked out GerritPatch and
+    ensures the manifest has the correct patch information afterwards.
     """
-    with TemporaryManifest() as f:
-      gerrit_patch = mock.MagicMock()
-      gerrit_patch.remote = 'cros-internal'
-      gerrit_patch.gerrit_number = '12345'
-      gerrit_patch.project = 'chromite/tacos'
-      gerrit_patch.project_url = 'https://host/chromite/tacos'
-      gerrit_patch.ref = 'refs/changes/11/12345/4'
-      gerrit_patch.tracking_branch = 'master'
-      gerrit_patch.change_id = '1234567890'
-      gerrit_patch.commit = '0987654321'
-      gerrit_patch.patch_number = '4'
-      gerrit_patch.owner_email = 'foo@chromium.org'
-      gerrit_patch.fail_count = 1
-      gerrit_patch.pass_count = 1
-      gerrit_patch.total_fail_count = 3
-      self.manager._AddPatchesToManifest(f.name, [gerrit_patch])
-
-      new_doc = minidom.parse(f.name)
-      element = new_doc.getElementsByTagName(
-          lkgm_manager.PALADIN_COMMIT_ELEMENT)[0]
-      self.assertEqual(element.getAttribute(
-          lkgm_manager.PALADIN_CHANGE_ID_ATTR), gerrit_patch.change_id)
-      self.assertEqual(element.getAttribute(
-          lkgm_manager.PALADIN_COMMIT_ATTR), gerrit_patch.commit)
-      self.assertEqual(element.getAttribute(lkgm_manager.PALADIN_PROJECT_ATTR),
-                       gerrit_patch.project)
-      self.assertEqual(element.getAttribute(lkgm_manager.PALADIN_REMOTE_ATTR),
-                       gerrit_patch.remote)
-      self.assertEqual(element.getAttribute(lkgm_manager.PALADIN_BRANCH_ATTR),
-                       gerrit_patch.tracking_branch)
-      self.assertEqual(element.getAttribute(lkgm_manager.PALADIN_REF_ATTR),
-                       gerrit_patch.ref)
-      self.assertEqual(
-          element.getAttribute(lkgm_manager.PALADIN_OWNER_EMAIL_ATTR),
-          gerrit_patch.owner_email)
-      self.assertEqual(
-          element.getAttribute(lkgm_manager.PALADIN_PROJECT_URL_ATTR),
-          gerrit_patch.project_url)
-      self.assertEqual(
-          element.getAttribute(lkgm_manager.PALADIN_PATCH_NUMBER_ATTR),
-          gerrit_patch.patch_number)
-      self.assertEqual(
-          element.getAttribute(lkgm_manager.PALADIN_FAIL_COUNT_ATTR),
-          str(gerrit_patch.fail_count))
-      self.assertEqual(
-          element.getAttribute(lkgm_manager.PALADIN_PASS_COUNT_ATTR),
-          str(gerrit_patch.pass_count))
-      self.assertEqual(
-          element.getAttribute(lkgm_manager.PALADIN_TOTAL_FAIL_COUNT_ATTR),
-          str(gerrit_patch.total_fail_count))
-
+    gerrit_patch = mock.MagicMock()
+    gerrit_patch.remote = 'cros-internal'
+    gerrit_patch.gerrit_number = '12345'
+    gerrit_patch.project = 'chromite/tacos'
+    gerrit_patch.project_url = 'https://host/chromite/tacos'
+    gerrit_patch.ref = 'refs/changes/11/12345/4'
+    gerrit_patch.tracking_branch = 'master'
+    gerrit_patch.change_id = '1234567890'
+    gerrit_patch.commit = '0987654321'
+    gerrit_patch.patch_number = '4'
+    gerrit_patch.owner_email = 'foo@chromium.org'
+    gerrit_patch.fail_count = 1
+    gerrit_patch.pass_count = 1
+    gerrit_patch.total_fail_count = 3
+
+    new_doc = EmptyManifestTree()
+    self.manager._AddPatchesToManifestTree(new_doc, [gerrit_patch])
+
+    element = new_doc.find('.//' + lkgm_manager.PALADIN_COMMIT_ELEMENT)
+    expected = {
+        lkgm_manager.PALADIN_REMOTE_ATTR: gerrit_patch.remote,
+        lkgm_manager.PALADIN_GERRIT_NUMBER_ATTR: gerrit_patch.gerrit_number,
+        lkgm_manager.PALADIN_PROJECT_ATTR: gerrit_patch.project,
+        lkgm_manager.PALADIN_PROJECT_URL_ATTR: gerrit_patch.project_url,
+        lkgm_manager.PALADIN_REF_ATTR: gerrit_patch.ref,
+        lkgm_manager.PALADIN_BRANCH_ATTR: gerrit_patch.tracking_branch,
+        lkgm_manager.PALADIN_CHANGE_ID_ATTR: gerrit_patch.change_id,
+        lkgm_manager.PALADIN_COMMIT_ATTR: gerrit_patch.commit,
+        lkgm_manager.PALADIN_PATCH_NUMBER_ATTR: gerrit_patch.patch_number,
+        lkgm_manager.PALADIN_OWNER_EMAIL_ATTR: gerrit_patch.owner_email,
+        lkgm_manager.PALADIN_FAIL_COUNT_ATTR: str(gerrit_patch.fail_count),
+        lkgm_manager.PALADIN_PASS_COUNT_ATTR: str(gerrit_patch.pass_count),
+        lkgm_manager.PALADIN_TOTAL_FAIL_COUNT_ATTR:
+            str(gerrit_patch.total_fail_count),
+    }
+    self.assertEqual(element.attrib, expected)
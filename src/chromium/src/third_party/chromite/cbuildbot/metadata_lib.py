@@ -10,7 +10,6 @@ import collections
 import datetime
 import json
 import math
-import multiprocessing
 import os
 import re
 
@@ -25,15 +24,23 @@ from chromite.lib import gs
 from chromite.lib import parallel
 
 
+# metadata.json files can be large; prefer the faster ujson decoder when it is
+# available and fall back to the standard library otherwise.
+try:
+  # pylint: disable=import-error
+  from ujson import loads as _JsonLoads
+except ImportError:
+  _JsonLoads = json.loads
+
+
 # Number of parallel processes used when uploading/downloading GS files.
 MAX_PARALLEL = 40
 
 ARCHIVE_ROOT = 'gs://chromeos-image-archive/%(target)s'
 # NOTE: gsutil 3.42 has a bug where '/' is ignored in this context unless it
 #       is listed twice. So we list it twice here for now.
-METADATA_URL_GLOB = os.path.join(ARCHIVE_ROOT,
-                                 'R%(milestone)s**//metadata.json')
-LATEST_URL = os.path.join(ARCHIVE_ROOT, 'LATEST-master')
+METADATA_URL_GLOB = ARCHIVE_ROOT + '/R%(milestone)s**//metadata.json'
+LATEST_URL = ARCHIVE_ROOT + '/LATEST-master'
 
 
 GerritPatchTuple = clactions.GerritPatchTuple
@@ -46,19 +53,10 @@ CLActionWithBuildTuple = collections.namedtuple(
     ['change', 'action', 'timestamp', 'reason', 'bot_type', 'build'])
 
 
-class _DummyLock(object):
-  """A Dummy clone of RLock that does nothing."""
-  def acquire(self, blocking=1):
-    pass
-
-  def release(self):
-    pass
+# Keys of a metadata dictionary that CBuildbotMetadata stores separately from
+# its flat _metadata_dict.
+_NESTED_METADATA_KEYS = ('cl_actions', 'board-metadata')
 
-  def __exit__(self, exc_type, exc_value, traceback):
-    pass
-
-  def __enter__(self):
-    pass
 
 class CBuildbotMetadata(object):
   """Class for recording metadata about a run."""
@@ -85,8 +83,8 @@ class CBuildbotMetadata(object):
       self._cl_action_list = []
       self._per_board_dict = {}
       # If we are not using a manager, then metadata is not expected to be
-      # multiprocess safe. Use a dummy RLock.
-      self._subdict_update_lock = _DummyLock()
+      # multiprocess safe. Skip locking altogether.
+      self._subdict_update_lock = None
 
     if metadata_dict:
       self.UpdateWithDict(metadata_dict)
@@ -102,7 +100,7 @@ class CBuildbotMetadata(object):
     Returns:
       A CbuildbotMetadata instance.
     """
-    return CBuildbotMetadata(json.loads(json_string))
+    return CBuildbotMetadata(_JsonLoads(json_string))
 
   def UpdateWithDict(self, metadata_dict):
     """Update metadata dictionary with values supplied in |metadata_dict|
@@ -126,38 +124,60 @@ class CBuildbotMetadata(object):
     # This is effectively the inverse of the dictionary construction in GetDict,
     # to reconstruct the correct internal representation of a metadata
     # object.
-    metadata_dict = metadata_dict.copy()
-    cl_action_list = metadata_dict.pop('cl_actions', None)
-    per_board_dict = metadata_dict.pop('board-metadata', None)
-    self._metadata_dict.update(metadata_dict)
+    cl_action_list = metadata_dict.get('cl_actions')
+    per_board_dict = metadata_dict.get('board-metadata')
+    self._metadata_dict.update(
+        {k: v for k, v in metadata_dict.items()
+         if k not in _NESTED_METADATA_KEYS})
     if cl_action_list:
       self._cl_action_list.extend(cl_action_list)
     if per_board_dict:
-      for k, v in per_board_dict.items():
-        self.UpdateBoardDictWithDict(k, v)
+      # Flatten all of the boards locally first, so that a multiprocess
+      # _per_board_dict is updated with a single call to the manager.
+      flat_dict = {}
+      for board, board_dict in per_board_dict.items():
+        flat_dict.update(self._FlattenBoardDict(board, board_dict))
+      self._per_board_dict.update(flat_dict)
 
     return self
 
-  def UpdateBoardDictWithDict(self, board, board_dict):
-    """Update the per-board dict for |board| with |board_dict|.
+  @staticmethod
+  def _FlattenBoardDict(board, board_dict):
+    """Return the flattened _per_board_dict entries for |board|.
 
-    Note: both |board| and and all the keys of |board_dict| musts be strings
-          that do not contain the character ':'
+    Note -- due to http://bugs.python.org/issue6766 it is not possible to
+    store a multiprocess dict proxy inside another multiprocess dict proxy.
+    That is why we are using this flattened representation of board dicts.
+
+    Args:
+      board: The board name. Must not contain the character ':'.
+      board_dict: A dict of per-board key-value pairs. Keys must not contain
+                  the character ':'.
 
     Returns:
-      self
+      A dict mapping 'board:key' strings to values.
     """
-    # Wrap the per-board key-value pairs as key-value pairs in _per_board_dict.
-    # Note -- due to http://bugs.python.org/issue6766 it is not possible to
-    # store a multiprocess dict proxy inside another multiprocess dict proxy.
-    # That is why we are using this flattened representation of board dicts.
     assert not ':' in board
     # Even if board_dict is {}, ensure that an entry with this board
     # gets written.
-    self._per_board_dict[board + ':'] = None
+    flat_dict = {board + ':': None}
     for k, v in board_dict.items():
       assert not ':' in k
-      self._per_board_dict['%s:%s' % (board, k)] = v
+      flat_dict['%s:%s' % (board, k)] = v
+    return flat_dict
+
+  def UpdateBoardDictWithDict(self, board, board_dict):
+    """Update the per-board dict for |board| with |board_dict|.
+
+    Note: both |board| and and all the keys of |board_dict| musts be strings
+          that do not contain the character ':'
+
+    Returns:
+      self
+    """
+    # Wrap the per-board key-value pairs as key-value pairs in _per_board_dict,
+    # writing them all with a single update.
+    self._per_board_dict.update(self._FlattenBoardDict(board, board_dict))
 
     return self
 
@@ -179,14 +199,21 @@ class CBuildbotMetadata(object):
     Returns:
       self
     """
-    with self._subdict_update_lock:
-      # If the key already exists, then use its dictionary
-      target_dict = self._metadata_dict.setdefault(key, {})
-      target_dict.update(key_metadata_dict)
-      self._metadata_dict[key] = target_dict
+    if self._subdict_update_lock is None:
+      self._UpdateKeyDict(key, key_metadata_dict)
+    else:
+      with self._subdict_update_lock:
+        self._UpdateKeyDict(key, key_metadata_dict)
 
     return self
 
+  def _UpdateKeyDict(self, key, key_metadata_dict):
+    """Helper for UpdateKeyDictWithDict; caller must hold any needed lock."""
+    # If the key already exists, then use its dictionary
+    target_dict = self._metadata_dict.setdefault(key, {})
+    target_dict.update(key_metadata_dict)
+    self._metadata_dict[key] = target_dict
+
   def GetDict(self):
     """Returns a dictionary representation of metadata."""
     # CL actions are be stored in self._cl_action_list instead of
@@ -200,7 +227,7 @@ class CBuildbotMetadata(object):
     # _per_board_dict. Un-flatten into nested dict.
     per_board_dict = {}
     for k, v in self._per_board_dict.items():
-      board, key = k.split(':')
+      board, _, key = k.partition(':')
       board_dict = per_board_dict.setdefault(board, {})
       if key:
         board_dict[key] = v
@@ -222,8 +249,8 @@ class CBuildbotMetadata(object):
     return self._metadata_dict[key]
 
   def GetJSON(self):
-    """Return a JSON string representation of metadata."""
-    return json.dumps(self.GetDict())
+    """Return a compact JSON string representation of metadata."""
+    return json.dumps(self.GetDict(), separators=(',', ':'))
 
   def RecordCLAction(self, change, action, timestamp=None, reason=''):
     """Record an action that was taken on a CL, to the metadata.
@@ -302,36 +329,33 @@ class CBuildbotMetadata(object):
         }
     }
 
-    metadata['results'] = []
+    results = metadata['results'] = []
+    non_failure_types = results_lib.Results.NON_FAILURE_TYPES
+    construct_url = builder_run.ConstructDashboardURL
     for entry in results_lib.Results.Get():
-      timestr = datetime.timedelta(seconds=math.ceil(entry.time))
-      if entry.result in results_lib.Results.NON_FAILURE_TYPES:
+      if entry.result in non_failure_types:
         status = constants.FINAL_STATUS_PASSED
       else:
         status = constants.FINAL_STATUS_FAILED
-      metadata['results'].append({
+      results.append({
           'name': entry.name,
           'status': status,
           # The result might be a custom exception.
           'summary': str(entry.result),
-          'duration': '%s' % timestr,
+          'duration': str(datetime.timedelta(seconds=math.ceil(entry.time))),
           'board': entry.board,
           'description': entry.description,
-          'log': builder_run.ConstructDashboardURL(stage=entry.name),
+          'log': construct_url(stage=entry.name),
       })
 
     if child_configs_list:
       metadata['child-configs'] = child_configs_list
 
     if get_changes_from_pool:
-      changes = []
-      pool = sync_instance.pool
-      for change in pool.changes:
-        details = {'gerrit_number': change.gerrit_number,
-                   'patch_number': change.patch_number,
-                   'internal': change.internal}
-        changes.append(details)
-      metadata['changes'] = changes
+      metadata['changes'] = [{'gerrit_number': change.gerrit_number,
+                              'patch_number': change.patch_number,
+                              'internal': change.internal}
+                             for change in sync_instance.pool.changes]
 
     # If we were a CQ master, then include a summary of the status of slave cq
     # builders in metadata
@@ -341,9 +365,9 @@ class CBuildbotMetadata(object):
         logging.warning('completion_instance did not have any statuses '
                         'to report. Will not add slave status to metadata.')
 
-      metadata['slave_targets'] = {}
-      for builder, status in statuses.iteritems():
-        metadata['slave_targets'][builder] = status.AsFlatDict()
+      metadata['slave_targets'] = {
+          builder: status.AsFlatDict()
+          for builder, status in statuses.iteritems()}
 
     return metadata
 
@@ -390,16 +414,23 @@ class BuildData(object):
   """
 
   __slots__ = (
-      'gathered_dict',  # Dict with gathered data (sheets version).
-      'gathered_url',   # URL to metadata.json.gathered location in GS.
-      'metadata_dict',  # Dict representing metadata data from JSON.
-      'metadata_url',   # URL to metadata.json location in GS.
+      '_finish_datetime',  # Cached parsed finish datetime.
+      '_patches',          # Cached tuple of GerritPatchTuples.
+      '_start_datetime',   # Cached parsed start datetime.
+      'gathered_dict',     # Dict with gathered data (sheets version).
+      'gathered_url',      # URL to metadata.json.gathered location in GS.
+      'metadata_dict',     # Dict representing metadata data from JSON.
+      'metadata_url',      # URL to metadata.json location in GS.
   )
 
   # Regexp for parsing datetimes as stored in metadata.json.  Example text:
   # Fri, 14 Feb 2014 17:00:49 -0800 (PST)
   DATETIME_RE = re.compile(r'^(.+)\s-\d\d\d\d\s\(P\wT\)$')
 
+  # Regexp for inferring a build number from a metadata URL.  Example text:
+  # gs://chromeos-image-archive/x86-generic-paladin/R35-1234.0.0-b5678/...
+  BUILD_NUMBER_RE = re.compile(r'-b(\d+)/')
+
   SHEETS_VER_KEY = 'sheets_version'
 
   @staticmethod
@@ -421,23 +452,23 @@ class BuildData(object):
     Returns:
       List of BuildData objects.
     """
-    gs_ctx = gs_ctx or gs.GSContext()
+    gs_ctx = gs_ctx or _GetGSContext()
     logging.info('Reading %d metadata URLs using %d processes now.', len(urls),
                  MAX_PARALLEL)
 
-    build_data_per_url = {}
     def _ReadMetadataURL(url):
       # Read the metadata.json URL and parse json into a dict.
-      metadata_dict = json.loads(gs_ctx.Cat(url, print_cmd=False))
+      metadata_dict = _JsonLoads(gs_ctx.Cat(url, print_cmd=False))
 
       # Read the file next to url which indicates whether the metadata has
       # been gathered before, and with what stats version.
       if get_sheets_version:
-        gathered_dict = {}
         gathered_url = url + '.gathered'
-        if gs_ctx.Exists(gathered_url, print_cmd=False):
-          gathered_dict = json.loads(gs_ctx.Cat(gathered_url,
-                                                print_cmd=False))
+        try:
+          gathered_dict = _JsonLoads(gs_ctx.Cat(gathered_url,
+                                                 print_cmd=False))
+        except gs.GSNoSuchKey:
+          gathered_dict = {}
 
         sheets_version = gathered_dict.get(BuildData.SHEETS_VER_KEY)
       else:
@@ -447,7 +478,7 @@ class BuildData(object):
 
       if bd.build_number is None:
         logging.warning('Metadata at %s was missing build number.', url)
-        m = re.match(r'.*-b([0-9]*)/.*', url)
+        m = BuildData.BUILD_NUMBER_RE.search(url)
         if m:
           inferred_number = int(m.groups()[0])
           logging.warning('Inferred build number %d from metadata url.',
@@ -460,13 +491,11 @@ class BuildData(object):
         logging.debug('Read %s:\n  build_number=%d, ungathered', url,
                       bd.build_number)
 
-      build_data_per_url[url] = bd
+      return bd
 
-    with multiprocessing.Manager() as manager:
-      build_data_per_url = manager.dict()
-      parallel.RunTasksInProcessPool(_ReadMetadataURL, [[url] for url in urls],
-                                     processes=MAX_PARALLEL)
-      builds = [build_data_per_url[url] for url in urls]
+    builds = parallel.RunTasksInProcessPool(_ReadMetadataURL,
+                                            [[url] for url in urls],
+                                            processes=MAX_PARALLEL)
 
     if exclude_running:
       builds = [b for b in builds if b.status != 'running']
@@ -482,29 +511,41 @@ class BuildData(object):
         for.
       gs_ctx: A GSContext object to use, if set.
     """
-    gs_ctx = gs_ctx or gs.GSContext()
+    gs_ctx = gs_ctx or _GetGSContext()
 
     # Filter for builds that were not already on these versions.
     builds = [b for b in builds if b.sheets_version != sheets_version]
     if builds:
       log_ver_str = 'Sheets v%d' % sheets_version
+      processes = min(MAX_PARALLEL, len(builds))
       logging.info('Marking %d builds gathered (for %s) using %d processes'
-                   ' now.', len(builds), log_ver_str, MAX_PARALLEL)
+                   ' now.', len(builds), log_ver_str, processes)
 
       def _MarkGathered(build):
-        build.MarkGathered(sheets_version)
-        json_text = json.dumps(build.gathered_dict.copy())
+        # Only mark |build| once the upload has succeeded, since it is the
+        # caller's own BuildData object when no process pool is used.
+        gathered_dict = build.gathered_dict.copy()
+        gathered_dict[BuildData.SHEETS_VER_KEY] = sheets_version
+        json_text = json.dumps(gathered_dict)
         gs_ctx.Copy('-', build.gathered_url, input=json_text, print_cmd=False)
+        build.MarkGathered(sheets_version)
         logging.debug('Marked build_number %d processed for %s.',
                       build.build_number, log_ver_str)
 
-      inputs = [[build] for build in builds]
-      parallel.RunTasksInProcessPool(_MarkGathered, inputs,
-                                     processes=MAX_PARALLEL)
+      if processes == 1:
+        # Not worth starting a process pool for a single upload.
+        _MarkGathered(builds[0])
+      else:
+        inputs = [[build] for build in builds]
+        parallel.RunTasksInProcessPool(_MarkGathered, inputs,
+                                       processes=processes)
 
   def __init__(self, metadata_url, metadata_dict, sheets_version=None):
     self.metadata_url = metadata_url
     self.metadata_dict = metadata_dict
+    self._start_datetime = None
+    self._finish_datetime = None
+    self._patches = None
 
     # If a stats version is not specified default to -1 so that the initial
     # version (version 0) will be considered "newer".
@@ -568,7 +609,7 @@ class BuildData(object):
 
   @classmethod
   def _ToDatetime(cls, time_str):
-    match = cls.DATETIME_RE.search(time_str)
+    match = cls.DATETIME_RE.match(time_str)
     if match:
       return datetime.datetime.strptime(match.group(1), '%a, %d %b %Y %H:%M:%S')
     else:
@@ -576,11 +617,15 @@ class BuildData(object):
 
   @property
   def start_datetime(self):
-    return self._ToDatetime(self['time']['start'])
+    if self._start_datetime is None:
+      self._start_datetime = self._ToDatetime(self['time']['start'])
+    return self._start_datetime
 
   @property
   def finish_datetime(self):
-    return self._ToDatetime(self['time']['finish'])
+    if self._finish_datetime is None:
+      self._finish_datetime = self._ToDatetime(self['time']['finish'])
+    return self._finish_datetime
 
   @property
   def start_date_str(self):
@@ -615,11 +660,11 @@ class BuildData(object):
       if stage['summary']:
         message_list.append('master: %s' % stage['summary'])
 
-    mapping = {}
+    mapping = collections.defaultdict(list)
     # Dedup the messages from the slaves.
-    for slave in self.GetFailedSlaves():
-      message = self.slaves[slave]['reason']
-      mapping[message] = mapping.get(message, []) + [slave]
+    for name, slave in self.slaves.iteritems():
+      if slave['status'] == 'fail':
+        mapping[slave['reason']].append(name)
 
     for message, slaves in mapping.iteritems():
       if len(slaves) >= 6:
@@ -681,10 +726,13 @@ class BuildData(object):
 
   @property
   def patches(self):
-    return [GerritPatchTuple(gerrit_number=int(change['gerrit_number']),
-                             patch_number=int(change['patch_number']),
-                             internal=change['internal'])
-            for change in self.metadata_dict.get('changes', [])]
+    if self._patches is None:
+      self._patches = tuple(
+          GerritPatchTuple(gerrit_number=int(change['gerrit_number']),
+                           patch_number=int(change['patch_number']),
+                           internal=change['internal'])
+          for change in self.metadata_dict.get('changes', []))
+    return self._patches
 
   @property
   def count_changes(self):
@@ -707,6 +755,28 @@ class BuildData(object):
 
 
 
+# Per-process caches for the helpers below. These are only touched from the
+# main thread of the scripts that use this module, so no locking is done.
+_GS_CONTEXT = None
+_SITE_CONFIG = None
+
+
+def _GetGSContext():
+  """Return a GSContext shared by the module level helpers."""
+  global _GS_CONTEXT
+  if _GS_CONTEXT is None:
+    _GS_CONTEXT = gs.GSContext()
+  return _GS_CONTEXT
+
+
+def _GetBuilderConfig(builder):
+  """Return the config for |builder|, loading the site config only once."""
+  global _SITE_CONFIG
+  if _SITE_CONFIG is None:
+    _SITE_CONFIG = cbuildbot_config.GetConfig()
+  return _SITE_CONFIG[builder]
+
+
 def FindLatestFullVersion(builder, version):
   """Find the latest full version number built by |builder| on |version|.
 
@@ -719,10 +789,10 @@ def FindLatestFullVersion(builder, version):
     E.g. R35-5602.0.0. For some builders, this may also include a -rcN or
     -bNNNN suffix.
   """
-  gs_ctx = gs.GSContext()
-  config = cbuildbot_config.GetConfig()[builder]
+  gs_ctx = _GetGSContext()
+  config = _GetBuilderConfig(builder)
   base_url = archive_lib.GetBaseUploadURI(config)
-  latest_file_url = os.path.join(base_url, 'LATEST-%s' % version)
+  latest_file_url = '%s/LATEST-%s' % (base_url, version)
   try:
     return gs_ctx.Cat(latest_file_url).strip()
   except gs.GSNoSuchKey:
@@ -742,14 +812,14 @@ def GetBuildMetadata(builder, full_version):
     A newly created CBuildbotMetadata object with the metadata from the given
     |builder| and |full_version|.
   """
-  gs_ctx = gs.GSContext()
-  config = cbuildbot_config.GetConfig()[builder]
+  gs_ctx = _GetGSContext()
+  config = _GetBuilderConfig(builder)
   base_url = archive_lib.GetBaseUploadURI(config)
   try:
-    archive_url = os.path.join(base_url, full_version)
-    metadata_url = os.path.join(archive_url, constants.METADATA_JSON)
+    metadata_url = '%s/%s/%s' % (base_url, full_version,
+                                 constants.METADATA_JSON)
     output = gs_ctx.Cat(metadata_url)
-    return CBuildbotMetadata(json.loads(output))
+    return CBuildbotMetadata(_JsonLoads(output))
   except gs.GSNoSuchKey:
     return None
 
@@ -766,7 +836,7 @@ def GetLatestMilestone():
   """Get the latest milestone from CQ Master LATEST-master file."""
   # Use CQ Master target to get latest milestone.
   latest_url = LATEST_URL % {'target': constants.CQ_MASTER}
-  gs_ctx = gs.GSContext()
+  gs_ctx = _GetGSContext()
 
   logging.info('Getting latest milestone from %s', latest_url)
   try:
@@ -798,7 +868,7 @@ def GetMetadataURLsSince(target, start_date, end_date):
   """
   ret = []
   milestone = GetLatestMilestone()
-  gs_ctx = gs.GSContext()
+  gs_ctx = _GetGSContext()
   while True:
     base_url = METADATA_URL_GLOB % {'target': target, 'milestone': milestone}
     logging.info('Getting %s builds for R%d from "%s"', target, milestone,
@@ -814,17 +884,18 @@ def GetMetadataURLsSince(target, start_date, end_date):
                    ' to older milestones.', target, milestone)
       break
 
-    # Sort by timestamp.
-    urls = sorted(urls, key=lambda x: x.creation_time, reverse=True)
-
-    # Add relevant URLs to our list.
-    ret.extend([x.url for x in urls
-                if (x.creation_time.date() >= start_date and
-                    x.creation_time.date() <= end_date)])
+    # Add relevant URLs to our list, tracking the date of the oldest URL in
+    # the current batch as we go.
+    oldest_date = datetime.date.max
+    for x in urls:
+      creation_date = x.creation_time.date()
+      if start_date <= creation_date <= end_date:
+        ret.append(x.url)
+      oldest_date = min(oldest_date, creation_date)
 
     # See if we have gone far enough back by checking datetime of oldest URL
     # in the current batch.
-    if urls[-1].creation_time.date() < start_date:
+    if oldest_date < start_date:
       break
     else:
       milestone -= 1
@@ -29,6 +29,16 @@ class MetadataFetchTest(cros_test_lib.TestCase):
 class MetadataTest(cros_test_lib.TestCase):
   """Tests the correctness of various metadata methods."""
 
+  @classmethod
+  def setUpClass(cls):
+    # Starting a manager spawns a server process, so share one across tests.
+    cls.manager = multiprocessing.Manager()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.manager.shutdown()
+    cls.manager = None
+
   def testGetDict(self):
     starting_dict = {
         'key1': 1,
@@ -44,8 +54,7 @@ class MetadataTest(cros_test_lib.TestCase):
 
   def testUpdateKeyDictWithDict(self):
     expected_dict = {str(x): x for x in range(20)}
-    m = multiprocessing.Manager()
-    metadata = metadata_lib.CBuildbotMetadata(multiprocess_manager=m)
+    metadata = metadata_lib.CBuildbotMetadata()
 
     metadata.UpdateKeyDictWithDict('my_dict', expected_dict)
 
@@ -54,12 +63,16 @@ class MetadataTest(cros_test_lib.TestCase):
 
   def testUpdateKeyDictWithDictMultiprocess(self):
     expected_dict = {str(x): x for x in range(20)}
-    m = multiprocessing.Manager()
+    m = self.manager
     metadata = metadata_lib.CBuildbotMetadata(multiprocess_manager=m)
 
+    # Send the keys in a few batches so that several concurrent updates still
+    # have to be merged into the same key dict.
+    items = expected_dict.items()
+    batch_size = 4
     with parallel.BackgroundTaskRunner(metadata.UpdateKeyDictWithDict) as q:
-      for k, v in expected_dict.iteritems():
-        q.put(['my_dict', {k: v}])
+      for i in xrange(0, len(items), batch_size):
+        q.put(['my_dict', dict(items[i:i + batch_size])])
 
     self.assertEqual(expected_dict, metadata.GetDict()['my_dict'])
 
@@ -80,7 +93,7 @@ class MetadataTest(cros_test_lib.TestCase):
         },
     }
 
-    m = multiprocessing.Manager()
+    m = self.manager
     metadata = metadata_lib.CBuildbotMetadata(metadata_dict=starting_dict,
                                               multiprocess_manager=m)
 
@@ -93,7 +106,7 @@ class MetadataTest(cros_test_lib.TestCase):
                      'some value')
 
   def testMultiprocessSafety(self):
-    m = multiprocessing.Manager()
+    m = self.manager
     metadata = metadata_lib.CBuildbotMetadata(multiprocess_manager=m)
     key_dict = {'key1': 1, 'key2': 2}
     starting_dict = {
@@ -138,7 +151,7 @@ class MetadataTest(cros_test_lib.TestCase):
 
     starting_dict = {'board-metadata': starting_per_board_dict}
 
-    m = multiprocessing.Manager()
+    m = self.manager
     metadata = metadata_lib.CBuildbotMetadata(metadata_dict=starting_dict,
                                               multiprocess_manager=m)
 
@@ -151,11 +164,10 @@ class MetadataTest(cros_test_lib.TestCase):
 
     expected_dict = starting_per_board_dict
 
-    # Write each per board key-value pair to metadata in a separate process.
+    # Write each board's dict to metadata in a separate process.
     with parallel.BackgroundTaskRunner(metadata.UpdateBoardDictWithDict) as q:
       for board, board_dict in extra_per_board_dict.iteritems():
         expected_dict.setdefault(board, {}).update(board_dict)
-        for k, v in board_dict.iteritems():
-          q.put([board, {k: v}])
+        q.put([board, board_dict])
 
     self.assertEqual(expected_dict, metadata.GetDict()['board-metadata'])
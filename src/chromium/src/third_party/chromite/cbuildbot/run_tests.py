@@ -15,10 +15,10 @@ from __future__ import print_function
 import errno
 import multiprocessing
 import os
+import shutil
 import signal
 import stat
 import sys
-import tempfile
 
 from chromite.cbuildbot import constants
 from chromite.lib import cgroups
@@ -51,6 +51,9 @@ OUTSIDE = 'outside'
 # Don't run this test (please add a comment as to why).
 SKIP = 'skip'
 
+# Path to chromite from the dir cros_sdk starts in (src/scripts).
+_CHROMITE_REL = os.path.join('..', '..', 'chromite')
+
 
 # List all exceptions, with a token describing what's odd here.
 SPECIAL_TESTS = {
@@ -98,13 +101,13 @@ SLOW_TESTS = {
 }
 
 
-def RunTest(test, cmd, tmpfile, finished, total):
-  """Run |test| with the |cmd| line and save output to |tmpfile|.
+def RunTest(test, cmd, logfile, finished, total):
+  """Run |test| with the |cmd| line and save failure output to |logfile|.
 
   Args:
     test: The human readable name for this test.
     cmd: The full command line to run the test.
-    tmpfile: File to write test output to.
+    logfile: Path to write the test output to if it fails.
     finished: Counter to update when this test finishes running.
     total: Total number of tests to run.
 
@@ -114,30 +117,31 @@ def RunTest(test, cmd, tmpfile, finished, total):
   logging.info('Starting %s', test)
 
   def _Finished(_log_level, _log_msg, result, delta):
+    # Only hold the lock long enough to bump the counter; the logging itself
+    # does not need to be serialized.
     with finished.get_lock():
       finished.value += 1
-      if result.returncode:
-        func = logging.error
-        msg = 'Failed'
-      else:
-        func = logging.info
-        msg = 'Finished'
-      func('%s [%i/%i] %s (%s)', msg, finished.value, total, test, delta)
+      count = finished.value
+    if result.returncode:
+      func = logging.error
+      msg = 'Failed'
+    else:
+      func = logging.info
+      msg = 'Finished'
+    func('%s [%i/%i] %s (%s)', msg, count, total, test, delta)
 
   ret = cros_build_lib.TimedCommand(
       cros_build_lib.RunCommand, cmd, capture_output=True, error_code_ok=True,
       combine_stdout_stderr=True, debug_level=logging.DEBUG,
       int_timeout=SIGINT_TIMEOUT, timed_log_callback=_Finished)
   if ret.returncode:
-    tmpfile.write(ret.output)
-    if not ret.output:
-      tmpfile.write('<no output>\n')
-  tmpfile.close()
+    output = ret.output.rstrip() or '<no output>'
+    osutils.WriteFile(logfile, output + '\n')
 
   return ret.returncode
 
 
-def BuildTestSets(tests, chroot_available, network):
+def BuildTestSets(tests, chroot_available, network, special_tests=None):
   """Build the tests to execute.
 
   Take care of special test handling like whether it needs to be inside or
@@ -147,27 +151,39 @@ def BuildTestSets(tests, chroot_available, network):
     tests: List of tests to execute.
     chroot_available: Whether we can execute tests inside the sdk.
     network: Whether to execute network tests.
+    special_tests: Dict of tests needing special handling; defaults to
+      SPECIAL_TESTS.
 
   Returns:
-    List of tests to execute and their full command line.
+    List of (test, cmd) tuples to execute: each test and its full command
+    line.
   """
+  if special_tests is None:
+    special_tests = SPECIAL_TESTS
+
   testsets = []
+  inside_chroot = cros_build_lib.IsInsideChroot()
+  # We wrap tests in coreutils' timeout rather than timing them out in Python:
+  # it kills the test's whole process group and preserves the output the test
+  # produced up to that point for the failure log.
+  timeout_cmd = ['timeout', '--preserve-status', '-k',
+                 '%sm' % TEST_SIG_TIMEOUT, '%sm' % TEST_TIMEOUT]
   for test in tests:
     cmd = [test]
 
     # See if this test requires special consideration.
-    status = SPECIAL_TESTS.get(test)
+    status = special_tests.get(test)
     if status is SKIP:
       logging.info('Skipping %s', test)
       continue
     elif status is INSIDE:
-      if not cros_build_lib.IsInsideChroot():
+      if not inside_chroot:
         if not chroot_available:
           logging.info('Skipping %s: chroot not available', test)
           continue
-        cmd = ['cros_sdk', '--', os.path.join('..', '..', 'chromite', test)]
+        cmd = ['cros_sdk', '--', os.path.join(_CHROMITE_REL, test)]
     elif status is OUTSIDE:
-      if cros_build_lib.IsInsideChroot():
+      if inside_chroot:
         logging.info('Skipping %s: must be outside the chroot', test)
         continue
     else:
@@ -184,16 +200,74 @@ def BuildTestSets(tests, chroot_available, network):
     cmd.append('--verbose')
     if network:
       cmd.append('--network')
-    cmd = ['timeout', '--preserve-status', '-k', '%sm' % TEST_SIG_TIMEOUT,
-           '%sm' % TEST_TIMEOUT] + cmd
+    cmd = timeout_cmd + cmd
 
-    testsets.append((test, cmd, tempfile.TemporaryFile()))
+    testsets.append((test, cmd))
 
   return testsets
 
 
+def _GetTestLog(logdir, idx):
+  """Return the path that the output of the |idx|th test is written to."""
+  return os.path.join(logdir, '%i.log' % idx)
+
+
+def _RunTestsWorker(testsets, logdir, next_test, finished, stop, dryrun,
+                    failfast):
+  """Run tests from |testsets| until there are none left.
+
+  Each worker claims the next pending test via the shared |next_test| index, so
+  a fixed set of workers can process all of the tests.
+
+  Args:
+    testsets: List of tests to execute as returned by BuildTestSets.
+    logdir: Directory to write the output of failed tests to.
+    next_test: Shared index of the next test in |testsets| to run.
+    finished: Counter to update when each test finishes running.
+    stop: Shared flag telling workers not to start any more tests.
+    dryrun: Do everything but execute the test.
+    failfast: Stop on first failure
+
+  Returns:
+    The exit code for the worker: 0 if all of its tests passed, else 1.
+  """
+  ret = 0
+  try:
+    while not stop.value:
+      with next_test.get_lock():
+        idx = next_test.value
+        next_test.value += 1
+      if idx >= len(testsets):
+        break
+
+      test, cmd = testsets[idx]
+      proctitle.settitle(test)
+      try:
+        if dryrun:
+          logging.info('Would have run: %s', cros_build_lib.CmdToStr(cmd))
+          test_ret = 0
+        else:
+          test_ret = RunTest(test, cmd, _GetTestLog(logdir, idx), finished,
+                             len(testsets))
+      except KeyboardInterrupt:
+        raise
+      except BaseException:
+        logging.error('%s failed', test, exc_info=True)
+        test_ret = 1
+
+      if test_ret:
+        ret = 1
+        if failfast:
+          logging.error('failure detected; stopping new tests')
+          stop.value = 1
+  except KeyboardInterrupt:
+    ret = 1
+
+  return ret
+
+
 def RunTests(tests, jobs=1, chroot_available=True, network=False, dryrun=False,
-             failfast=False):
+             failfast=False, special_tests=None):
   """Execute |paths| with |jobs| in parallel (including |network| tests).
 
   Args:
@@ -203,13 +277,17 @@ def RunTests(tests, jobs=1, chroot_available=True, network=False, dryrun=False,
     network: Whether to run network based tests.
     dryrun: Do everything but execute the test.
     failfast: Stop on first failure
+    special_tests: Dict of tests needing special handling; defaults to
+      SPECIAL_TESTS.
 
   Returns:
     True if all tests pass, else False.
   """
   finished = multiprocessing.Value('i')
+  next_test = multiprocessing.Value('i')
+  stop = multiprocessing.Value('i')
   testsets = []
-  pids = []
+  pids = set()
   failed = aborted = False
 
   def WaitOne():
@@ -217,61 +295,62 @@ def RunTests(tests, jobs=1, chroot_available=True, network=False, dryrun=False,
     pids.remove(pid)
     return status
 
-  # Launch all the tests!
-  try:
-    # Build up the testsets.
-    testsets = BuildTestSets(tests, chroot_available, network)
-
-    # Fork each test and add it to the list.
-    for test, cmd, tmpfile in testsets:
-      if failed and failfast:
-        logging.error('failure detected; stopping new tests')
-        break
-
-      if len(pids) >= jobs:
+  # Only tests that fail write out a log, so we don't have to hold a file open
+  # for every test up front.
+  with osutils.TempDir(prefix='chromite.run_tests.logs.') as logdir:
+    # Launch all the tests!
+    try:
+      # Build up the testsets.
+      testsets = BuildTestSets(tests, chroot_available, network,
+                               special_tests=special_tests)
+
+      # Fork a fixed pool of workers which pull tests off the list until it is
+      # exhausted, rather than forking once per test.
+      for _ in xrange(min(jobs, len(testsets))):
+        pid = os.fork()
+        if pid == 0:
+          ret = 1
+          try:
+            ret = _RunTestsWorker(testsets, logdir, next_test, finished, stop,
+                                  dryrun, failfast)
+          except BaseException:
+            logging.error('test worker failed', exc_info=True)
+          # We cannot run clean up hooks in the child because it'll break down
+          # things like tempdir context managers.
+          os._exit(ret)  # pylint: disable=protected-access
+        pids.add(pid)
+
+      # Wait for all of them to get cleaned up.
+      while pids:
         if WaitOne():
           failed = True
-      pid = os.fork()
-      if pid == 0:
-        proctitle.settitle(test)
-        ret = 1
-        try:
-          if dryrun:
-            logging.info('Would have run: %s', cros_build_lib.CmdToStr(cmd))
-            ret = 0
-          else:
-            ret = RunTest(test, cmd, tmpfile, finished, len(testsets))
-        except KeyboardInterrupt:
-          pass
-        except BaseException:
-          logging.error('%s failed', test, exc_info=True)
-        # We cannot run clean up hooks in the child because it'll break down
-        # things like tempdir context managers.
-        os._exit(ret)  # pylint: disable=protected-access
-      pids.append(pid)
-
-    # Wait for all of them to get cleaned up.
-    while pids:
-      if WaitOne():
-        failed = True
 
-  except KeyboardInterrupt:
-    # If the user wants to stop, reap all the pending children.
-    logging.warning('CTRL+C received; cleaning up tests')
-    aborted = True
-    CleanupChildren(pids)
-
-  # Walk through the results.
-  failed_tests = []
-  for test, cmd, tmpfile in testsets:
-    tmpfile.seek(0)
-    output = tmpfile.read()
-    if output:
-      failed_tests.append(test)
-      print()
-      logging.error('### LOG: %s', test)
-      print(output.rstrip())
-      print()
+    except KeyboardInterrupt:
+      # Ignore further CTRL+C straight away so it can't interrupt the cleanup.
+      handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+      try:
+        # If the user wants to stop, reap all the pending children.
+        logging.warning('CTRL+C received; cleaning up tests')
+        aborted = True
+        # Keep the workers from picking up any more tests.
+        stop.value = 1
+        CleanupChildren(pids)
+      finally:
+        signal.signal(signal.SIGINT, handler)
+
+    # Walk through the results.
+    failed_tests = []
+    for idx, (test, _cmd) in enumerate(testsets):
+      logfile = _GetTestLog(logdir, idx)
+      if os.path.exists(logfile):
+        failed_tests.append(test)
+        print()
+        logging.error('### LOG: %s', test)
+        # Stream the log rather than reading it all into memory first.
+        sys.stdout.flush()
+        with open(logfile) as f:
+          shutil.copyfileobj(f, sys.stdout)
+        print()
 
   if failed_tests:
     logging.error('The following %i tests failed:\n  %s', len(failed_tests),
@@ -284,40 +363,30 @@ def RunTests(tests, jobs=1, chroot_available=True, network=False, dryrun=False,
 
 
 def CleanupChildren(pids):
-  """Clean up all the children in |pids|."""
+  """Clean up all the children in the set |pids|.
+
+  The caller should ignore SIGINT while this runs.
+  """
   # Note: SIGINT was already sent due to the CTRL+C via the kernel itself.
   # So this func is just waiting for them to clean up.
-  handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
-
-  def _CheckWaitpid(ret):
-    (pid, _status) = ret
-    if pid:
-      try:
-        pids.remove(pid)
-      except ValueError:
-        # We might have reaped a grandchild -- be robust.
-        pass
-    return len(pids)
-
-  def _Waitpid():
-    try:
-      return os.waitpid(-1, os.WNOHANG)
-    except OSError as e:
-      if e.errno == errno.ECHILD:
-        # All our children went away!
-        pids[:] = []
-        return (0, 0)
-      else:
-        raise
-
-  def _RemainingTime(remaining):
-    print('\rwaiting %s for %i tests to exit ... ' % (remaining, len(pids)),
-          file=sys.stderr, end='')
-
   try:
-    timeout_util.WaitForSuccess(_CheckWaitpid, _Waitpid,
-                                timeout=CTRL_C_TIMEOUT, period=0.1,
-                                side_effect_func=_RemainingTime)
+    # Block in waitpid so children are reaped as soon as they exit; the timeout
+    # interrupts us if they take too long.
+    with timeout_util.Timeout(CTRL_C_TIMEOUT):
+      while pids:
+        print('\rwaiting for %i tests to exit ... ' % len(pids),
+              file=sys.stderr, end='')
+        try:
+          (pid, _status) = os.waitpid(-1, 0)
+        except OSError as e:
+          if e.errno == errno.ECHILD:
+            # All our children went away!
+            pids.clear()
+            break
+          else:
+            raise
+        # We might have reaped a grandchild -- be robust.
+        pids.discard(pid)
     print('All tests cleaned up!')
     return
   except timeout_util.TimeoutError:
@@ -329,37 +398,44 @@ def CleanupChildren(pids):
       except OSError as e:
         if e.errno != errno.ESRCH:
           raise
-  finally:
-    signal.signal(signal.SIGINT, handler)
 
 
 def FindTests(search_paths=('.',)):
   """Find all the tests available in |search_paths|."""
   for search_path in search_paths:
     for root, dirs, files in os.walk(search_path):
-      if os.path.exists(os.path.join(root, '.testignore')):
+      # os.walk already listed the dir, so check for the ignore file in that
+      # listing rather than stat-ing for it.
+      if '.testignore' in files:
         # Delete the dir list in place.
         dirs[:] = []
         continue
 
       dirs[:] = [x for x in dirs if x[0] != '.']
 
+      rel_root = os.path.relpath(root, search_path)
       for path in files:
-        test = os.path.join(os.path.relpath(root, search_path), path)
-        if test.endswith('_unittest'):
-          yield test
+        if path.endswith('_unittest'):
+          yield os.path.join(rel_root, path)
+
+
+# Cached result of ChrootAvailable().
+_CHROOT_AVAILABLE = None
 
 
 def ChrootAvailable():
   """See if `cros_sdk` will work at all.
 
   If we try to run unittests in the buildtools group, we won't be able to
-  create one.
+  create one.  The answer is cached as `repo list` can be slow.
   """
-  ret = cros_build_lib.RunCommand(
-      ['repo', 'list'], capture_output=True, error_code_ok=True,
-      combine_stdout_stderr=True, debug_level=logging.DEBUG)
-  return 'chromiumos-overlay' in ret.output
+  global _CHROOT_AVAILABLE
+  if _CHROOT_AVAILABLE is None:
+    ret = cros_build_lib.RunCommand(
+        ['repo', 'list'], capture_output=True, error_code_ok=True,
+        combine_stdout_stderr=True, debug_level=logging.DEBUG)
+    _CHROOT_AVAILABLE = 'chromiumos-overlay' in ret.output
+  return _CHROOT_AVAILABLE
 
 
 def _ReExecuteIfNeeded(argv, network):
@@ -425,8 +501,10 @@ def main(argv):
   os.chdir(constants.CHROMITE_DIR)
   tests = opts.tests or FindTests()
 
+  special_tests = SPECIAL_TESTS
   if opts.quick:
-    SPECIAL_TESTS.update(SLOW_TESTS)
+    special_tests = dict(SPECIAL_TESTS)
+    special_tests.update(SLOW_TESTS)
 
   jobs = opts.jobs or multiprocessing.cpu_count()
 
@@ -447,7 +525,7 @@ def main(argv):
     ret = cros_build_lib.TimedCommand(
         RunTests, tests, jobs=jobs, chroot_available=ChrootAvailable(),
         network=opts.network, dryrun=opts.dryrun, failfast=opts.failfast,
-        timed_log_callback=_Finished)
+        special_tests=special_tests, timed_log_callback=_Finished)
     if not ret:
       return 1
 
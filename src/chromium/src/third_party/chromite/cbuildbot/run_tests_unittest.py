@@ -104,13 +104,15 @@ class MainTest(cros_test_lib.MockOutputTestCase):
 
   def testQuick(self):
     """Verify --quick filters out slow tests"""
-    self.PatchObject(run_tests, 'RunTests', return_value=True)
+    m = self.PatchObject(run_tests, 'RunTests', return_value=True)
     # Pick a test that is in SLOW_TESTS but not in SPECIAL_TESTS.
     slow_test = 'lib/patch_unittest'
     self.assertIn(slow_test, run_tests.SLOW_TESTS)
     self.assertNotIn(slow_test, run_tests.SPECIAL_TESTS)
     run_tests.main(['--quick'])
-    self.assertIn(slow_test, run_tests.SPECIAL_TESTS)
+    self.assertIn(slow_test, m.call_args[1]['special_tests'])
+    # The module-level list must be left alone.
+    self.assertNotIn(slow_test, run_tests.SPECIAL_TESTS)
 
   def testSpecificTests(self):
     """Verify user specified tests are run."""
@@ -118,4 +120,5 @@ class MainTest(cros_test_lib.MockOutputTestCase):
     tests = ['./some/foo_unittest', './bar_unittest']
     run_tests.main(tests)
     m.assert_called_with(tests, jobs=mock.ANY, chroot_available=mock.ANY,
-                         network=mock.ANY, dryrun=mock.ANY, failfast=mock.ANY)
+                         network=mock.ANY, dryrun=mock.ANY, failfast=mock.ANY,
+                         special_tests=mock.ANY)
@@ -6,6 +6,7 @@
 
 from __future__ import print_function
 
+import bz2
 import mock
 import os
 
@@ -15,7 +16,6 @@ from chromite.cbuildbot import cbuildbot_unittest
 from chromite.cbuildbot.stages import chrome_stages
 from chromite.cbuildbot.stages import generic_stages_unittest
 from chromite.lib import cidb
-from chromite.lib import cros_build_lib
 from chromite.lib import cros_build_lib_unittest
 from chromite.lib import cros_test_lib
 from chromite.lib import osutils
@@ -73,10 +73,8 @@ class ChromeSDKStageTest(cbuildbot_unittest.SimpleBuilderTestCase,
     stage = self.ConstructStage()
     chrome_env_dir = os.path.join(
         stage._pkg_dir, constants.CHROME_CP + '-25.3643.0_rc1')
-    env_file = os.path.join(chrome_env_dir, 'environment')
-    osutils.Touch(env_file, makedirs=True)
-
-    cros_build_lib.RunCommand(['bzip2', env_file])
+    env_file = os.path.join(chrome_env_dir, 'environment.bz2')
+    osutils.WriteFile(env_file, bz2.compress(''), makedirs=True)
 
     # Run the code.
     stage._ArchiveChromeEbuildEnv()
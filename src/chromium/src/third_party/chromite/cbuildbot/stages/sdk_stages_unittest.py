@@ -19,6 +19,23 @@ from chromite.lib import perf_uploader
 from chromite.lib import portage_util
 
 
+def _ListTarball(tarball):
+  """Return the paths in |tarball|, rooted at '/' rather than './'."""
+  output = cros_build_lib.RunCommand(
+      ['tar', '-I', 'xz', '-tf', tarball], capture_output=True).output
+  return [x[1:] for x in output.splitlines()]
+
+
+def _FakeJsonData(packages):
+  """Return the manifest 'packages' dict expected for |packages|."""
+  json_data = {}
+  for package, v in packages:
+    cpv = portage_util.SplitCPV('%s-%s' % (package, v))
+    key = '%s/%s' % (cpv.category, cpv.package)
+    json_data.setdefault(key, []).append([v, {}])
+  return json_data
+
+
 class SDKBuildToolchainsStageTest(
     generic_stages_unittest.AbstractStageTestCase):
   """Tests SDK toolchain building."""
@@ -41,8 +58,7 @@ class SDKBuildToolchainsStageTest(
       buildroot, cmd = call[0]
       self.assertTrue(isinstance(buildroot, basestring))
       self.assertTrue(isinstance(cmd, (tuple, list)))
-      for ele in cmd:
-        self.assertTrue(isinstance(ele, basestring))
+      self.assertTrue(all(isinstance(ele, basestring) for ele in cmd), cmd)
 
 
 class SDKPackageStageTest(generic_stages_unittest.AbstractStageTestCase):
@@ -50,6 +66,7 @@ class SDKPackageStageTest(generic_stages_unittest.AbstractStageTestCase):
 
   fake_packages = (('cat1/package', '1'), ('cat1/package', '2'),
                    ('cat2/package', '3'), ('cat2/package', '4'))
+  fake_json_data = _FakeJsonData(fake_packages)
 
   def setUp(self):
     # Replace SudoRunCommand, since we don't care about sudo.
@@ -58,13 +75,8 @@ class SDKPackageStageTest(generic_stages_unittest.AbstractStageTestCase):
 
     # Prepare a fake chroot.
     self.fake_chroot = os.path.join(self.build_root, 'chroot/build/amd64-host')
-    self.fake_json_data = {}
     osutils.SafeMakedirs(self.fake_chroot)
     osutils.Touch(os.path.join(self.fake_chroot, 'file'))
-    for package, v in self.fake_packages:
-      cpv = portage_util.SplitCPV('%s-%s' % (package, v))
-      key = '%s/%s' % (cpv.category, cpv.package)
-      self.fake_json_data.setdefault(key, []).append([v, {}])
 
   def ConstructStage(self):
     return sdk_stages.SDKPackageStage(self._run)
@@ -85,13 +97,7 @@ class SDKPackageStageTest(generic_stages_unittest.AbstractStageTestCase):
     self.RunStage()
 
     # Check tarball for the correct contents.
-    output = cros_build_lib.RunCommand(
-        ['tar', '-I', 'xz', '-tvf', fake_tarball],
-        capture_output=True).output.splitlines()
-    # First line is './', use it as an anchor, count the chars, and strip as
-    # much from all other lines.
-    stripchars = len(output[0]) - 1
-    tar_lines = [x[stripchars:] for x in output]
+    tar_lines = _ListTarball(fake_tarball)
     self.assertNotIn('/build/amd64-host/', tar_lines)
     self.assertIn('/file', tar_lines)
     # Verify manifest contents.
@@ -120,52 +126,26 @@ class SDKPackageStageTest(generic_stages_unittest.AbstractStageTestCase):
         self.tempdir, sdk_tarball, 'http://some/log', '123.4.5.6', 'sdk-bot')
     # pylint: enable=protected-access
 
+    def _PerfValue(description, value):
+      return perf_uploader.PerformanceValue(
+          description=description,
+          value=value,
+          units='bytes',
+          higher_is_better=False,
+          graph='cros-sdk-size',
+          stdio_uri='http://some/log',
+      )
+
     perf_values = m.call_args[0][0]
-    exp = perf_uploader.PerformanceValue(
-        description='base',
-        value=sdk_size,
-        units='bytes',
-        higher_is_better=False,
-        graph='cros-sdk-size',
-        stdio_uri='http://some/log',
-    )
-    self.assertEqual(exp, perf_values[0])
-
-    exp = set((
-        perf_uploader.PerformanceValue(
-            description='arm-cros-linux-gnu',
-            value=0,
-            units='bytes',
-            higher_is_better=False,
-            graph='cros-sdk-size',
-            stdio_uri='http://some/log',
-        ),
-        perf_uploader.PerformanceValue(
-            description='i686-pc-linux-gnu',
-            value=0,
-            units='bytes',
-            higher_is_better=False,
-            graph='cros-sdk-size',
-            stdio_uri='http://some/log',
-        ),
-        perf_uploader.PerformanceValue(
-            description='base_plus_arm-cros-linux-gnu',
-            value=sdk_size,
-            units='bytes',
-            higher_is_better=False,
-            graph='cros-sdk-size',
-            stdio_uri='http://some/log',
-        ),
-        perf_uploader.PerformanceValue(
-            description='base_plus_i686-pc-linux-gnu',
-            value=sdk_size,
-            units='bytes',
-            higher_is_better=False,
-            graph='cros-sdk-size',
-            stdio_uri='http://some/log',
-        ),
+    self.assertEqual(_PerfValue('base', sdk_size), perf_values[0])
+
+    exp = frozenset((
+        _PerfValue('arm-cros-linux-gnu', 0),
+        _PerfValue('i686-pc-linux-gnu', 0),
+        _PerfValue('base_plus_arm-cros-linux-gnu', sdk_size),
+        _PerfValue('base_plus_i686-pc-linux-gnu', sdk_size),
     ))
-    self.assertEqual(exp, set(perf_values[1:]))
+    self.assertEqual(exp, frozenset(perf_values[1:]))
 
     platform_name = m.call_args[0][1]
     self.assertEqual(platform_name, 'sdk-bot')
@@ -230,13 +210,8 @@ class SDKPackageBoardToolchainsStageTest(
                                      constants.DEFAULT_CHROOT_DIR,
                                      constants.SDK_BOARD_OVERLAYS_OUTPUT,
                                      'built-sdk-overlay-%s.tar.xz' % board)
-      output = cros_build_lib.RunCommand(
-          ['tar', '-I', 'xz', '-tvf', overlay_tarball],
-          capture_output=True).output.splitlines()
-      # First line is './', use it as an anchor, count the chars, and strip as
-      # much from all other lines.
-      stripchars = len(output[0]) - 1
-      tar_lines = [x[stripchars:] for x in output[1:]]
+      # The first entry is the './' anchor.
+      tar_lines = _ListTarball(overlay_tarball)[1:]
       # Check that the overlay tarball contains the marker file only.
       self.assertListEqual(['/%s.tmp' % board], tar_lines)
 
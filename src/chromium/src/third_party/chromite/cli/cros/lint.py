@@ -19,7 +19,9 @@ as many/few checkers as we want in this one module.
 
 from __future__ import print_function
 
+import itertools
 import os
+import re
 import sys
 
 from pylint.checkers import BaseChecker
@@ -102,6 +104,21 @@ class DocStringChecker(BaseChecker):
 
   # TODO: Should we enforce Examples?
   VALID_SECTIONS = ('Args', 'Returns', 'Yields', 'Raises',)
+  _SECTION_INDEX = {x: i for i, x in enumerate(VALID_SECTIONS)}
+  # Lines that end the Args section.
+  _SECTION_SENTINELS = frozenset([''] + ['%s:' % x for x in VALID_SECTIONS])
+
+  # Common misnamings of the valid sections (compared in lowercase).
+  _INVALID_SECTIONS = frozenset((
+      'arg', 'argument', 'arguments',
+      'ret', 'rets', 'return',
+      'yield', 'yeild', 'yeilds',
+      'raise', 'throw', 'throws',
+  ))
+
+  # Matches a line that could be a section header: a single word followed by
+  # a colon or nothing at all.  The word is what we compare to section names.
+  _SECTION_RE = re.compile(r'\s*([A-Za-z]+)(?::|\s*$)')
 
   def visit_function(self, node):
     """Verify function docstrings"""
@@ -138,14 +155,10 @@ class DocStringChecker(BaseChecker):
     if lines is None:
       lines = node.doc.split('\n')
 
-    funcs = (
-        self._check_first_line,
-        self._check_second_line_blank,
-        self._check_whitespace,
-        self._check_last_line,
-    )
-    for f in funcs:
-      f(node, lines)
+    self._check_first_line(node, lines)
+    self._check_second_line_blank(node, lines)
+    self._check_whitespace(node, lines)
+    self._check_last_line(node, lines)
 
   def _check_first_line(self, node, lines):
     """Make sure first line is a short summary by itself"""
@@ -169,20 +182,20 @@ class DocStringChecker(BaseChecker):
     #
     # Also check for multiple blank lines in a row.
     last_blank = False
-    for i, l in enumerate(lines[:-1]):
-      margs = {'offset': i, 'line': l}
-
-      if l.rstrip() != l:
+    for i, l in enumerate(itertools.islice(lines, len(lines) - 1)):
+      if l[-1:].isspace():
+        margs = {'offset': i, 'line': l}
         self.add_message('C9003', node=node, line=node.fromlineno, args=margs)
 
-      curr_blank = l == ''
+      curr_blank = not l
       if last_blank and curr_blank:
+        margs = {'offset': i, 'line': l}
         self.add_message('C9013', node=node, line=node.fromlineno, args=margs)
       last_blank = curr_blank
 
     # Now specially handle the last line.
     l = lines[-1]
-    if l.strip() != '' and l.rstrip() != l:
+    if l[-1:].isspace() and not l.isspace():
       margs = {'offset': len(lines), 'line': l}
       self.add_message('C9003', node=node, line=node.fromlineno, args=margs)
 
@@ -208,26 +221,23 @@ class DocStringChecker(BaseChecker):
   def _check_section_lines(self, node, lines):
     """Verify each section (Args/Returns/Yields/Raises) is sane"""
     lineno_sections = [-1] * len(self.VALID_SECTIONS)
-    invalid_sections = (
-        # Handle common misnamings.
-        'arg', 'argument', 'arguments',
-        'ret', 'rets', 'return',
-        'yield', 'yeild', 'yeilds',
-        'raise', 'throw', 'throws',
-    )
 
     last = lines[0].strip()
     for i, line in enumerate(lines[1:]):
-      margs = {'offset': i + 1, 'line': line}
       l = line.strip()
 
       # Catch semi-common javadoc style.
-      if l.startswith('@param') or l.startswith('@return'):
+      if l.startswith(('@param', '@return')):
+        margs = {'offset': i + 1, 'line': line}
         self.add_message('C9007', node=node, line=node.fromlineno, args=margs)
 
       # See if we can detect incorrect behavior.
-      section = l.split(':', 1)[0]
-      if section in self.VALID_SECTIONS or section.lower() in invalid_sections:
+      m = self._SECTION_RE.match(line)
+      section = m.group(1) if m else ''
+      misnamed = section.lower() in self._INVALID_SECTIONS
+      if misnamed or section in self._SECTION_INDEX:
+        margs = {'offset': i + 1, 'line': line}
+
         # Make sure it has some number of leading whitespace.
         if not line.startswith(' '):
           self.add_message('C9004', node=node, line=node.fromlineno, args=margs)
@@ -237,11 +247,11 @@ class DocStringChecker(BaseChecker):
           self.add_message('C9007', node=node, line=node.fromlineno, args=margs)
 
         # Make sure it's valid.
-        if section.lower() in invalid_sections:
+        if misnamed:
           self.add_message('C9007', node=node, line=node.fromlineno, args=margs)
         else:
           # Gather the order of the sections.
-          lineno_sections[self.VALID_SECTIONS.index(section)] = i
+          lineno_sections[self._SECTION_INDEX[section]] = i
 
         # Verify blank line before it.
         if last != '':
@@ -250,10 +260,13 @@ class DocStringChecker(BaseChecker):
       last = l
 
     # Make sure the sections are in the right order.
-    valid_lineno = lambda x: x >= 0
-    lineno_sections = filter(valid_lineno, lineno_sections)
-    if lineno_sections != sorted(lineno_sections):
-      self.add_message('C9008', node=node, line=node.fromlineno)
+    lineno_sections = [x for x in lineno_sections if x >= 0]
+    prev = -1
+    for lineno in lineno_sections:
+      if lineno < prev:
+        self.add_message('C9008', node=node, line=node.fromlineno)
+        break
+      prev = lineno
 
     # Check the indentation level on all the sections.
     # The -1 line holds the trailing """ itself and that should be indented to
@@ -278,7 +291,7 @@ class DocStringChecker(BaseChecker):
     arg_lines = []
     for l in lines:
       if arg_lines:
-        if l.strip() in [''] + ['%s:' % x for x in self.VALID_SECTIONS]:
+        if l.strip() in self._SECTION_SENTINELS:
           break
       elif l.strip() != 'Args:':
         continue
@@ -287,6 +300,14 @@ class DocStringChecker(BaseChecker):
       # If they don't have an Args section, then give it a pass.
       return
 
+    # Index the documented args by name so each lookup below is O(1).  Only
+    # the first line documenting a given name counts.
+    documented_args = {}
+    for l in arg_lines:
+      name, sep, amsg = l.lstrip().partition(':')
+      if sep:
+        documented_args.setdefault(name, (l, amsg))
+
     # Now verify all args exist.
     # TODO: Should we verify arg order matches doc order ?
     # TODO: Should we check indentation of wrapped docs ?
@@ -299,17 +320,15 @@ class DocStringChecker(BaseChecker):
       if arg.name.startswith('_'):
         continue
 
-      for l in arg_lines:
-        aline = l.lstrip()
-        if aline.startswith('%s:' % arg.name):
-          amsg = aline[len(arg.name) + 1:]
-          if len(amsg) and len(amsg) - len(amsg.lstrip()) != 1:
-            margs = {'arg': l}
-            self.add_message('C9012', node=node, line=node.fromlineno,
-                             args=margs)
-          break
-      else:
+      doc = documented_args.get(arg.name)
+      if doc is None:
         missing_args.append(arg.name)
+        continue
+
+      l, amsg = doc
+      if len(amsg) and len(amsg) - len(amsg.lstrip()) != 1:
+        margs = {'arg': l}
+        self.add_message('C9012', node=node, line=node.fromlineno, args=margs)
 
     if missing_args:
       margs = {'arg': '|, |'.join(missing_args)}
@@ -359,17 +378,15 @@ class Py3kCompatChecker(BaseChecker):
       if self.saw_imports:
         self.add_message('R9100')
 
-  def _check_print_function(self, node):
-    """Verify print_function is imported"""
-    if node.modname == '__future__':
-      for name, _ in node.names:
-        if name == 'print_function':
-          self.seen_print_func = True
-
   def visit_from(self, node):
     """Process 'from' statements"""
     self.saw_imports = True
-    self._check_print_function(node)
+    # Verify print_function is imported; once seen, there's nothing to check.
+    if not self.seen_print_func and node.modname == '__future__':
+      for name, _ in node.names:
+        if name == 'print_function':
+          self.seen_print_func = True
+          break
 
   def visit_import(self, _node):
     """Process 'import' statements"""
@@ -453,15 +470,15 @@ class ChromiteLoggingChecker(BaseChecker):
     for name, _ in node.names:
       if name == 'logging':
         self.add_message('R9301', line=node.lineno)
+        # One message per import statement is enough.
+        return
 
 
 def register(linter):
   """pylint will call this func to register all our checkers"""
   # Walk all the classes in this module and register ours.
   this_module = sys.modules[__name__]
-  for member in dir(this_module):
-    if (not member.endswith('Checker') or
-        member in ('BaseChecker', 'IAstroidChecker')):
-      continue
-    cls = getattr(this_module, member)
-    linter.register_checker(cls(linter))
+  for _, cls in sorted(vars(this_module).iteritems()):
+    if (isinstance(cls, type) and issubclass(cls, BaseChecker) and
+        cls is not BaseChecker):
+      linter.register_checker(cls(linter))
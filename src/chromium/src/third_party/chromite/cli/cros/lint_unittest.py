@@ -353,6 +353,12 @@ class ChromiteLoggingCheckerTest(CheckerTestCase):
     self.checker.visit_import(node)
     self.assertEqual(self.results, [('R9301', '', 15, None)])
 
+  def testLoggingImportedTwice(self):
+    """Test that an import statement is flagged only once."""
+    node = TestNode(names=[('logging', None), ('logging', 'log')], lineno=15)
+    self.checker.visit_import(node)
+    self.assertEqual(self.results, [('R9301', '', 15, None)])
+
   def testLoggingNotImported(self):
     """Test that importing something else (not logging) is not flagged."""
     node = TestNode(names=[('myModule', None)], lineno=15)
@@ -17,6 +17,9 @@ from chromite.lib import osutils
 CHROME_COMMITTER_URL = 'https://chromium.googlesource.com/chromium/src'
 STATUS_URL = 'https://chromium-status.appspot.com/current?format=json'
 
+# Cached result of _HostIsCIBuilder().
+_HOST_IS_CI_BUILDER = None
+
 
 def FindGclientFile(path):
   """Returns the nearest higher-level gclient file from the specified path.
@@ -47,11 +50,12 @@ def _LoadGclientFile(path):
     solutions exists.
   """
   global_scope = {}
-  # Similar to depot_tools, we use execfile() to evaluate the gclient file,
-  # which is essentially a Python script, and then extract the solutions
-  # defined by the gclient file from the 'solutions' variable in the global
-  # scope.
-  execfile(path, global_scope)
+  # Similar to depot_tools, we exec() the gclient file, which is essentially a
+  # Python script, and then extract the solutions defined by the gclient file
+  # from the 'solutions' variable in the global scope.  Compiling it ourselves
+  # rather than using execfile() also works with Python 3.
+  code = compile(osutils.ReadFile(path), path, 'exec')
+  exec(code, global_scope)  # pylint: disable=exec-used
   return global_scope.get('solutions', [])
 
 
@@ -136,6 +140,17 @@ def _GetGclientSolutions(internal, rev, template):
   return solutions
 
 
+def _HostIsCIBuilder():
+  """Return whether we're on a CI builder.
+
+  The answer is cached as it needs a reverse DNS lookup of our hostname.
+  """
+  global _HOST_IS_CI_BUILDER
+  if _HOST_IS_CI_BUILDER is None:
+    _HOST_IS_CI_BUILDER = cros_build_lib.HostIsCIBuilder()
+  return _HOST_IS_CI_BUILDER
+
+
 def _GetGclientSpec(internal, rev, template, use_cache):
   """Return a formatted gclient spec.
 
@@ -148,7 +163,7 @@ def _GetGclientSpec(internal, rev, template, use_cache):
   # Horrible hack, I will go to hell for this.  The bots need to have a git
   # cache set up; but how can we tell whether this code is running on a bot
   # or a developer's machine?
-  if cros_build_lib.HostIsCIBuilder() and use_cache:
+  if use_cache and _HostIsCIBuilder():
     result += "cache_dir = '/b/git-cache'\n"
 
   return result
@@ -12,6 +12,11 @@ import re
 from chromite.lib import osutils
 
 
+# Matches a whole line whose first non-blank character starts a comment.  The
+# line itself is left in place (empty) so JSON errors report the right line.
+_COMMENT_LINE_RE = re.compile(r'^[^\S\n]*#.*$', re.MULTILINE)
+
+
 def AssertIsInstance(instance, expected_type, description):
   """Raise an error if |instance| is not of |expected_type|.
 
@@ -55,8 +60,5 @@ def ParseJsonFileWithComments(path):
   Returns:
     Python representation of contents of JSON file.
   """
-  prog = re.compile(r'\s*#.*')
-  lines = osutils.ReadFile(path).splitlines()
-  lines = ['' if prog.match(line) else line for line in lines]
-  parsed_contents = json.loads('\n'.join(lines))
-  return parsed_contents
+  contents = _COMMENT_LINE_RE.sub('', osutils.ReadFile(path))
+  return json.loads(contents)
@@ -20,6 +20,13 @@ from chromite.lib import osutils
 LOCK_ACQUIRED = 5
 LOCK_NOT_ACQUIRED = 6
 
+# Every combination of (blocking, shared, locking mechanism).
+LOCK_OPTIONS = tuple(itertools.product(
+    (True, False),
+    (True, False),
+    (locking.FLOCK, locking.LOCKF),
+))
+
 
 class LockingTest(cros_test_lib.TempDirTestCase):
   """Test the Locking class."""
@@ -48,11 +55,15 @@ class LockingTest(cros_test_lib.TempDirTestCase):
 
     osutils.SafeUnlink(self.lock_file)
 
-  def _HelperInsideProcess(self, blocking, shared, locktype=locking.LOCKF):
+  def _HelperInsideProcess(self, blocking, shared, locktype=locking.LOCKF,
+                           ready=None):
     """Helper method that runs a basic test with/without blocking."""
     try:
       lock = locking.FileLock(
           self.lock_file, blocking=blocking, locktype=locktype)
+      # Let our parent know we're about to try for the lock.
+      if ready is not None:
+        ready.set()
       with lock.lock(shared):
         pass
       sys.exit(LOCK_ACQUIRED)
@@ -61,13 +72,16 @@ class LockingTest(cros_test_lib.TempDirTestCase):
 
   def _HelperStartProcess(self, blocking=False, shared=False):
     """Create a process and invoke _HelperInsideProcess in it."""
+    ready = multiprocessing.Event()
     p = multiprocessing.Process(target=self._HelperInsideProcess,
-                                args=(blocking, shared))
+                                args=(blocking, shared, locking.LOCKF, ready))
     p.start()
 
-    # It's highly probably that p will have tried to grab the lock before the
-    # timer expired, but not certain.
-    time.sleep(0.1)
+    # Wait until p is about to grab the lock, then give it a moment to get into
+    # the blocking call.  It's highly probable that p will be waiting on the
+    # lock by then, but not certain.
+    self.assertTrue(ready.wait(5))
+    time.sleep(0.01)
 
     return p
 
@@ -78,16 +92,11 @@ class LockingTest(cros_test_lib.TempDirTestCase):
                                 args=(blocking, shared, locktype))
     p.start()
     p.join()
-    self.assertEquals(p.exitcode, expected)
+    self.assertEqual(p.exitcode, expected)
 
   def testSingleLock(self):
     """Just test getting releasing a lock with options."""
-    arg_list = [
-        [True, False], # blocking
-        [True, False], # shared
-        [locking.FLOCK, locking.LOCKF], # locking mechanism
-    ]
-    for args in itertools.product(*arg_list):
+    for args in LOCK_OPTIONS:
       self._HelperSingleLockTest(*args)
 
   def testDoubleLockWithFlock(self):
@@ -101,7 +110,8 @@ class LockingTest(cros_test_lib.TempDirTestCase):
       self.assertTrue(lock1.IsLocked())
       self.assertFalse(lock2.IsLocked())
 
-      self.assertRaises(locking.LockNotAcquiredError, lock2.write_lock)
+      with self.assertRaises(locking.LockNotAcquiredError):
+        lock2.write_lock()
       self.assertTrue(lock1.IsLocked())
       self.assertFalse(lock2.IsLocked())
 
@@ -164,14 +174,8 @@ class LockingTest(cros_test_lib.TempDirTestCase):
 
   def testSingleProcessLock(self):
     """Test grabbing the same lock in processes with no conflicts."""
-    arg_list = [
-        [LOCK_ACQUIRED],
-        [True, False], # blocking
-        [True, False], # shared
-        [locking.FLOCK, locking.LOCKF], # locking mechanism
-    ]
-    for args in itertools.product(*arg_list):
-      self._HelperWithProcess(*args)
+    for args in LOCK_OPTIONS:
+      self._HelperWithProcess(LOCK_ACQUIRED, *args)
 
   def testNonBlockingConflicts(self):
     """Test that we get a lock conflict for non-blocking locks."""
@@ -206,7 +210,7 @@ class LockingTest(cros_test_lib.TempDirTestCase):
     # when the with clause exits, p should unblock and get the lock, setting
     # its exit code to sucess now.
     p.join()
-    self.assertEquals(p.exitcode, LOCK_ACQUIRED)
+    self.assertEqual(p.exitcode, LOCK_ACQUIRED)
 
     # Intial lock is NON blocking.
     with locking.FileLock(self.lock_file, blocking=False).write_lock():
@@ -217,7 +221,7 @@ class LockingTest(cros_test_lib.TempDirTestCase):
     # when the with clause exits, p should unblock and get the lock, setting
     # it's exit code to sucess now.
     p.join()
-    self.assertEquals(p.exitcode, LOCK_ACQUIRED)
+    self.assertEqual(p.exitcode, LOCK_ACQUIRED)
 
     # Intial lock is shared, blocking lock is exclusive.
     with locking.FileLock(self.lock_file, blocking=False).read_lock():
@@ -230,6 +234,6 @@ class LockingTest(cros_test_lib.TempDirTestCase):
     # when the with clause exits, p should unblock and get the lock, setting
     # it's exit code to sucess now.
     p.join()
-    self.assertEquals(p.exitcode, LOCK_ACQUIRED)
+    self.assertEqual(p.exitcode, LOCK_ACQUIRED)
     q.join()
-    self.assertEquals(p.exitcode, LOCK_ACQUIRED)
+    self.assertEqual(q.exitcode, LOCK_ACQUIRED)
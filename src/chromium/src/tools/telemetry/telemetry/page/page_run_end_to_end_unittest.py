@@ -31,14 +31,10 @@ from telemetry.testing import system_stub
 
 # pylint: disable=bad-super-call
 
-SIMPLE_CREDENTIALS_STRING = """
-{
-  "test": {
-    "username": "example",
-    "password": "asdf"
-  }
-}
-"""
+# Matches the name of the exception ending each formatted traceback.
+_TRACEBACK_EXCEPTION_NAME_RE = re.compile(r'^Traceback.*?^(\w+)',
+                                          re.DOTALL | re.MULTILINE)
+
 class DummyTest(page_test.PageTest):
   def ValidateAndMeasurePage(self, *_):
     pass
@@ -92,6 +88,8 @@ class PageRunEndToEndTests(unittest.TestCase):
   # TODO(nduca): Move the basic "test failed, test succeeded" tests from
   # page_test_unittest to here.
 
+  _base_dir = util.GetUnittestDataDir()
+
   def setUp(self):
     self._story_runner_logging_stub = None
     self._formatted_exception_buffer = StringIO.StringIO()
@@ -118,29 +116,30 @@ class PageRunEndToEndTests(unittest.TestCase):
       self._story_runner_logging_stub = None
 
   def assertFormattedExceptionIsEmpty(self):
-    self.longMessage = False
-    self.assertEquals(
-        '', self.formatted_exception,
-        msg='Expected empty formatted exception: actual=%s' % '\n   > '.join(
-            self.formatted_exception.split('\n')))
+    formatted_exception = self.formatted_exception
+    if formatted_exception:
+      self.fail('Expected empty formatted exception: actual=%s' %
+                formatted_exception.replace('\n', '\n   > '))
 
   def assertFormattedExceptionOnlyHas(self, expected_exception_name):
-    self.longMessage = True
-    actual_exception_names = re.findall(r'^Traceback.*?^(\w+)',
-                                        self.formatted_exception,
-                                        re.DOTALL | re.MULTILINE)
-    self.assertEquals([expected_exception_name], actual_exception_names,
-                      msg='Full formatted exception: %s' % '\n   > '.join(
-                          self.formatted_exception.split('\n')))
+    formatted_exception = self.formatted_exception
+    actual_exception_names = _TRACEBACK_EXCEPTION_NAME_RE.findall(
+        formatted_exception)
+    # Only build the (potentially large) failure message on a mismatch.
+    if actual_exception_names != [expected_exception_name]:
+      self.longMessage = True
+      self.assertEquals([expected_exception_name], actual_exception_names,
+                        msg='Full formatted exception: %s' %
+                        formatted_exception.replace('\n', '\n   > '))
 
   def testRaiseBrowserGoneExceptionFromRestartBrowserBeforeEachPage(self):
     self.CaptureFormattedException()
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
     story_set.AddStory(page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir()))
+        'file://blank.html', story_set, base_dir=self._base_dir))
     story_set.AddStory(page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir()))
+        'file://blank.html', story_set, base_dir=self._base_dir))
 
     class Test(page_test.PageTest):
       def __init__(self, *args):
@@ -175,9 +174,9 @@ class PageRunEndToEndTests(unittest.TestCase):
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
     story_set.AddStory(page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir()))
+        'file://blank.html', story_set, base_dir=self._base_dir))
     story_set.AddStory(page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir()))
+        'file://blank.html', story_set, base_dir=self._base_dir))
 
     class Test(page_test.PageTest):
       def __init__(self, *args, **kwargs):
@@ -242,36 +241,30 @@ class PageRunEndToEndTests(unittest.TestCase):
     expectations = test_expectations.TestExpectations()
     did_run = [False]
 
-    try:
-      with tempfile.NamedTemporaryFile(delete=False) as f:
-        page = page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir(),
-        credentials_path=f.name)
-        page.credentials = "test"
-        story_set.AddStory(page)
-
-        f.write(SIMPLE_CREDENTIALS_STRING)
-
-      class TestThatInstallsCredentialsBackend(page_test.PageTest):
-        def __init__(self, credentials_backend):
-          super(TestThatInstallsCredentialsBackend, self).__init__()
-          self._credentials_backend = credentials_backend
-
-        def DidStartBrowser(self, browser):
-          browser.credentials.AddBackend(self._credentials_backend)
-
-        def ValidateAndMeasurePage(self, *_):
-          did_run[0] = True
-
-      test = TestThatInstallsCredentialsBackend(credentials_backend)
-      options = options_for_unittests.GetCopy()
-      options.output_formats = ['none']
-      options.suppress_gtest_report = True
-      SetUpStoryRunnerArguments(options)
-      results = results_options.CreateResults(EmptyMetadataForTest(), options)
-      story_runner.Run(test, story_set, expectations, options, results)
-    finally:
-      os.remove(f.name)
+    page = page_module.Page(
+        'file://blank.html', story_set, base_dir=self._base_dir,
+        credentials_path='test_credentials.json')
+    page.credentials = "test"
+    story_set.AddStory(page)
+
+    class TestThatInstallsCredentialsBackend(page_test.PageTest):
+      def __init__(self, credentials_backend):
+        super(TestThatInstallsCredentialsBackend, self).__init__()
+        self._credentials_backend = credentials_backend
+
+      def DidStartBrowser(self, browser):
+        browser.credentials.AddBackend(self._credentials_backend)
+
+      def ValidateAndMeasurePage(self, *_):
+        did_run[0] = True
+
+    test = TestThatInstallsCredentialsBackend(credentials_backend)
+    options = options_for_unittests.GetCopy()
+    options.output_formats = ['none']
+    options.suppress_gtest_report = True
+    SetUpStoryRunnerArguments(options)
+    results = results_options.CreateResults(EmptyMetadataForTest(), options)
+    story_runner.Run(test, story_set, expectations, options, results)
 
     return did_run[0]
 
@@ -280,7 +273,7 @@ class PageRunEndToEndTests(unittest.TestCase):
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
     page = page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir(),
+        'file://blank.html', story_set, base_dir=self._base_dir,
         shared_page_state_class=shared_page_state.SharedTabletPageState)
     story_set.AddStory(page)
 
@@ -311,7 +304,7 @@ class PageRunEndToEndTests(unittest.TestCase):
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
     page = page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir())
+        'file://blank.html', story_set, base_dir=self._base_dir)
     story_set.AddStory(page)
 
     class TestOneTab(page_test.PageTest):
@@ -335,7 +328,7 @@ class PageRunEndToEndTests(unittest.TestCase):
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
     page = page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir())
+        'file://blank.html', story_set, base_dir=self._base_dir)
     story_set.AddStory(page)
 
     class TestMultiTabs(page_test.PageTest):
@@ -359,7 +352,7 @@ class PageRunEndToEndTests(unittest.TestCase):
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
     page = page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir())
+        'file://blank.html', story_set, base_dir=self._base_dir)
     story_set.AddStory(page)
 
     class TestBeforeLaunch(page_test.PageTest):
@@ -390,9 +383,8 @@ class PageRunEndToEndTests(unittest.TestCase):
   def testRunPageWithStartupUrl(self):
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
-    expectations = test_expectations.TestExpectations()
     page = page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir(),
+        'file://blank.html', story_set, base_dir=self._base_dir,
         startup_url='about:blank')
     story_set.AddStory(page)
 
@@ -426,7 +418,7 @@ class PageRunEndToEndTests(unittest.TestCase):
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
     page = page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir())
+        'file://blank.html', story_set, base_dir=self._base_dir)
     story_set.AddStory(page)
 
     class Test(page_test.PageTest):
@@ -462,7 +454,7 @@ class PageRunEndToEndTests(unittest.TestCase):
 
     story_set.AddStory(page_module.Page(
         url='file://blank.html', page_set=story_set,
-        base_dir=util.GetUnittestDataDir(),
+        base_dir=self._base_dir,
         shared_page_state_class=UnrunnableSharedState))
     expectations = test_expectations.TestExpectations()
 
@@ -493,7 +485,7 @@ class PageRunEndToEndTests(unittest.TestCase):
     story_set = story.StorySet()
     expectations = test_expectations.TestExpectations()
     story_set.AddStory(page_module.Page(
-        'file://blank.html', story_set, base_dir=util.GetUnittestDataDir()))
+        'file://blank.html', story_set, base_dir=self._base_dir))
 
     class Measurement(page_test.PageTest):
       def ValidateAndMeasurePage(self, page, tab, results):
@@ -527,8 +519,7 @@ class PageRunEndToEndTests(unittest.TestCase):
     story_set = story.StorySet()
     for _ in range(5):
       story_set.AddStory(
-          TestPage('file://blank.html', story_set,
-                   base_dir=util.GetUnittestDataDir()))
+          TestPage('file://blank.html', story_set, base_dir=self._base_dir))
     expectations = test_expectations.TestExpectations()
     options = options_for_unittests.GetCopy()
     options.output_formats = ['none']